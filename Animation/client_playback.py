@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+# importing numpy
+import numpy as np
+
+# importing convexhull from scipy
+from scipy.spatial import ConvexHull
+
+from Animation.nearest_marker import marking_opponent
+
+"""
+Client side playback - a window of frames is sent to the browser once, as flat float32 arrays, and a
+javascript timer plays the frames. The server only works when the slider is moved (seek) or when the
+timer runs past the end of the window and asks for the next one by moving the slider.
+
+"""
+
+PLAYBACK_JS = """
+    if (button._timer) {
+        clearInterval(button._timer);
+        button._timer = null;
+        button.label = '► Play';
+        slider.value = button._time;
+        return;
+    }
+
+    button.label = '❚❚ Pause';
+    button._time = slider.value;
+    button._start = slider.value;
+    button._wall = Date.now();
+
+    button._timer = setInterval(function() {
+
+        var times = frames.data.time;
+        var now = Date.now();
+
+        /* game time due by the wall clock - frames the browser had no time to draw are skipped */
+        var time = button._start + (now - button._wall) / interval * step * speed;
+        if (time > slider.end) {
+            button._start = time = slider.start;
+            button._wall = now;
+        }
+
+        var lo = 0, hi = times.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (times[mid] <= time + 1e-6) { lo = mid + 1; } else { hi = mid; }
+        }
+        var k = lo - 1;
+
+        if (k < 0 || (k == times.length - 1 && time - times[k] > step)) {
+            time = slider.start + Math.round((time - slider.start) / step) * step;
+            if (button._requested !== time) {
+                button._requested = time;
+                slider.value = time;
+            }
+            return;
+        }
+
+        if (times[k] === button._time) {
+            return;
+        }
+
+        var n = frames.data.players[0];
+        button._time = times[k];
+
+        source_coord.data.x = frame_xy.data.x.slice(k * n, (k + 1) * n);
+        source_coord.data.y = frame_xy.data.y.slice(k * n, (k + 1) * n);
+        source_coord.change.emit();
+
+        /* update frame */
+
+    }, interval / Math.min(speed, 1));
+"""
+
+HULL_JS = """
+        var a0 = frames.data.att_start[k], a1 = frames.data.att_stop[k];
+        var d0 = frames.data.def_start[k], d1 = frames.data.def_stop[k];
+
+        source_ch_att.data.xc = hull_xy.data.x.slice(a0, a1);
+        source_ch_att.data.yc = hull_xy.data.y.slice(a0, a1);
+        source_ch_att.change.emit();
+
+        source_ch_def.data.ax = hull_xy.data.x.slice(d0, d1);
+        source_ch_def.data.ay = hull_xy.data.y.slice(d0, d1);
+        source_ch_def.change.emit();
+"""
+
+LINES_JS = """
+        var m = frames.data.line_values[0];
+
+        source_lines.data.x = line_xy.data.x.slice(k * m, (k + 1) * m);
+        source_lines.data.y = line_xy.data.y.slice(k * m, (k + 1) * m);
+        source_lines.change.emit();
+"""
+
+
+def playback_js(update=''):
+
+    """
+    :param update: Javascript that updates the other sources for the frame k
+    :return: Returns the code of the play button for client side playback
+    """
+    return PLAYBACK_JS.replace('/* update frame */', update)
+
+
+def window_frames(store, position, n_frames):
+
+    """
+            Parameters
+    ---------------------------
+    :param store: FrameStore of the match
+    :param position: Position of the first frame of the window
+    :param n_frames: Number of frames in the window
+
+    :return: Returns the frame positions of the window and the flat float32 x and y arrays of all the players
+             for those frames (frames * players), NaN for missing players.
+    """
+    positions = np.arange(position, min(position + n_frames, len(store)))
+    xy = np.asarray(store.xy[positions[0]:positions[-1] + 1])
+
+    return positions, xy[:, :, 0].ravel(), xy[:, :, 1].ravel()
+
+
+def window_hulls(store, positions, team_code, visible=True):
+
+    """
+            Parameters
+    ---------------------------
+    :param store: FrameStore of the match
+    :param positions: Frame positions of the window
+    :param team_code: Team to compute the convex hull for
+    :param visible: (True/False) - If False, the hulls are not computed and every frame has an empty hull
+
+    :return: Returns the flat x and y arrays of the hull vertices of all the frames, and the start and
+             stop offsets of each frame in those arrays.
+    """
+    xs, ys, counts = [], [], np.zeros(len(positions), dtype=np.int32)
+
+    for i, position in enumerate(positions if visible else []):
+        team_xy = store.frame(position, team_code)[0]
+        if len(team_xy) < 3:
+            continue
+        vertices = ConvexHull(team_xy).vertices
+        xs.append(team_xy[vertices, 0])
+        ys.append(team_xy[vertices, 1])
+        counts[i] = len(vertices)
+
+    stops = np.cumsum(counts, dtype=np.int32)
+    x = np.concatenate(xs).astype(np.float32) if xs else np.zeros(0, dtype=np.float32)
+    y = np.concatenate(ys).astype(np.float32) if ys else np.zeros(0, dtype=np.float32)
+
+    return x, y, stops - counts, stops
+
+
+def window_lines(store, positions, source_players, target_players, assignment='nearest'):
+
+    """
+            Parameters
+    ---------------------------
+    :param store: FrameStore of the match
+    :param positions: Frame positions of the window
+    :param source_players: Slice of the players axis of the players marking
+    :param target_players: Slice of the players axis of the players being marked
+    :param assignment: ('nearest'/'optimal') - Pairs of each frame, see marking_opponent
+
+    :return: Returns the flat x and y arrays of the lines between each player and the player it marks. Each frame
+             has (source players * 3) values - start, end and a NaN separator for each line - and the lines that
+             don't exist in a frame are all NaN.
+    """
+    source_xy = np.asarray(store.xy[positions[0]:positions[-1] + 1, source_players])
+    target_xy = np.asarray(store.xy[positions[0]:positions[-1] + 1, target_players])
+
+    _, closest = marking_opponent(source_xy, target_xy, assignment)
+
+    target = np.take_along_axis(target_xy, np.maximum(closest, 0)[:, :, None], axis=1)
+    target[closest < 0] = np.nan
+
+    separator = np.full(source_xy.shape[:2], np.nan, dtype=np.float32)
+
+    line_x = np.stack((source_xy[:, :, 0], target[:, :, 0], separator), axis=2).ravel()
+    line_y = np.stack((source_xy[:, :, 1], target[:, :, 1], separator), axis=2).ravel()
+
+    return line_x, line_y
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import shutil
+import subprocess
+import tempfile
+
+# importing pandas and numpy
+import numpy as np
+import pandas as pd
+
+# importing convexhull and voronoi from scipy
+from scipy.spatial import ConvexHull, Voronoi
+
+# matplotlib is only needed to export the animation. The figures are drawn on their own Agg canvas, without
+# pyplot, so the backend of the user is not changed.
+try:
+    from matplotlib import image
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import PolyCollection
+    from matplotlib.figure import Figure
+except ImportError:
+    Figure = None
+
+from Animation.frame_store import FrameStore, TEAM_DEF, TEAM_ATT
+from Animation.nearest_marker import nearest_opponent
+from Animation.flat_geometry import nan_separated, segments
+from Animation.patches_from_voronoi import voronoi_geometry
+
+"""
+Headless export of the animation - the frames drawn by make_plot (players, labels, convex hulls, voronoi and the
+marking lines of player_marking) are rendered to png files with matplotlib, in parallel over a process pool,
+and can be assembled into a video with ffmpeg.
+
+"""
+
+COLORS = np.array(['dodgerblue', 'orangered', 'gold'])
+
+# state of each export process - the store and the figure are created once per process, not once per frame
+_worker = {}
+
+
+def _init_worker(path, options):
+
+    _worker.clear()
+    _worker['store'] = FrameStore.load(path)
+    _worker['options'] = options
+    _worker['figure'] = None
+
+
+def _figure(options):
+
+    """
+    Creates the figure of the process and draws the background (pitch image) once - each frame is drawn over a
+    copy of the background, so the image is not resampled for every frame
+    """
+    x_range, y_range = options['x_range'], options['y_range']
+
+    fig = Figure(figsize=(options['width'] / 100., options['height'] / 100.), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_xlim(min(x_range), max(x_range))
+    ax.set_ylim(min(y_range), max(y_range))
+    ax.axis('off')
+
+    if options['image'] is not None:
+        ax.imshow(image.imread(options['image']), extent=[min(x_range), max(x_range), min(y_range), max(y_range)],
+                  aspect='auto', zorder=0)
+
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+
+    return fig, ax, background
+
+
+def _draw_frame(store, position, ax, options):
+
+    """
+    Draws the layers of one frame and returns the artists, so they can be removed before the next frame
+    """
+    artists = []
+    frame_xy, players = store.frame(position)
+
+    if options['voronoi'] and len(frame_xy) > 2:
+        x, y, offsets, x_ls, y_ls, ls_offsets = voronoi_geometry(Voronoi(frame_xy))
+
+        cells = [np.column_stack(cell) for cell in zip(np.split(x, offsets[1:-1]), np.split(y, offsets[1:-1]))]
+        artists.append(ax.add_collection(PolyCollection([cell for cell in cells if len(cell)],
+                                                        facecolor='dodgerblue', edgecolor='black',
+                                                        alpha=.1, linewidth=1, zorder=1)))
+        artists += ax.plot(nan_separated(x_ls, ls_offsets), nan_separated(y_ls, ls_offsets),
+                           color='black', linewidth=1, zorder=1)
+
+    if options['convex_hull']:
+        for team_code, color in [(TEAM_ATT, 'orangered'), (TEAM_DEF, 'dodgerblue')]:
+            team_xy = store.frame(position, team_code)[0]
+            if len(team_xy) < 3:
+                continue
+            artists += ax.fill(*team_xy[ConvexHull(team_xy).vertices].T, facecolor=color, edgecolor='black',
+                               alpha=.1, linewidth=3, zorder=2)
+
+    if options['marking_lines']:
+        att_xy, def_xy = store.xy[position, store.team(TEAM_ATT)], store.xy[position, store.team(TEAM_DEF)]
+        source_xy, target_xy = (att_xy, def_xy) if options['attack'] else (def_xy, att_xy)
+
+        closest = nearest_opponent(source_xy[None], target_xy[None])[1][0]
+        found = closest >= 0
+
+        artists += ax.plot(segments(source_xy[found, 0], target_xy[closest[found], 0]),
+                           segments(source_xy[found, 1], target_xy[closest[found], 1]),
+                           color='orangered', linewidth=3, alpha=.7, linestyle='--', solid_capstyle='round',
+                           zorder=3)
+
+    artists.append(ax.scatter(frame_xy[:, 0], frame_xy[:, 1], s=200, c=COLORS[store.team_codes[players]],
+                              edgecolors='black', zorder=4))
+
+    if options['labels']:
+        for (x, y), player_id in zip(frame_xy, store.player_ids[players]):
+            artists.append(ax.text(x, y, player_id, fontsize=8, ha='center', va='center', zorder=5))
+
+    return artists
+
+
+def _render(positions, paths):
+
+    store, options = _worker['store'], _worker['options']
+
+    if _worker['figure'] is None:
+        _worker['figure'] = _figure(options)
+    fig, ax, background = _worker['figure']
+
+    for position, path in zip(positions, paths):
+        fig.canvas.restore_region(background)
+
+        artists = _draw_frame(store, position, ax, options)
+        for artist in sorted(artists, key=lambda artist: artist.get_zorder()):
+            ax.draw_artist(artist)
+
+        image.imsave(path, np.asarray(fig.canvas.buffer_rgba()), pil_kwargs=dict(compress_level=1))
+
+        for artist in artists:
+            artist.remove()
+
+    return len(positions)
+
+
+def export_frames(df, out_dir, x_range, y_range, headers=None, id_def=None, id_att=None, sport='football',
+                  start=None, end=None, image_url=None, voronoi=True, convex_hull=True, labels=True,
+                  marking_lines=False, attack=True, width=850, height=550, workers=None):
+
+    """
+            Parameters
+    ---------------------------
+    :param df: Gets the user defined dataframe, a FrameStore or the path of a converted match
+    :param out_dir: Directory the png files are written to - frame_00000.png, frame_00001.png, ...
+    :param x_range: Provide x range of the pitch coordinates
+    :param y_range: Provide y range of the pitch coordinates
+    :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
+    :param id_def: Provide id of defending team
+    :param id_att: Provide id of attacking team
+    :param sport: (football/basketball)
+    :param start: Game time of the first frame to export. Defaults to the start of the match.
+    :param end: Game time of the last frame to export. Defaults to the end of the match.
+    :param image_url: Local path of the background image of the pitch. Default value is None (no image).
+    :param voronoi: (True/False) - Draw the voronoi. Default value is True.
+    :param convex_hull: (True/False) - Draw the convex hull of both teams. Default value is True.
+    :param labels: (True/False) - Draw the player ids. Default value is True.
+    :param marking_lines: (True/False) - Draw the lines from each player to the nearest opponent, same as
+                        player_marking. Default value is False.
+    :param attack: (True/False) - If 'True', the marking lines start from the attacking team.
+    :param width: Width of the frames in pixels. Default value is 850.
+    :param height: Height of the frames in pixels. Default value is 550.
+    :param workers: Number of processes used to render the frames. Defaults to the number of cores.
+
+    Frames are split into contiguous chunks rendered by a pool of processes. Each process opens the match as a
+    memory map (a dataframe is converted to a temporary directory first), so the match is not copied to every
+    process, and reuses one figure for all its frames.
+
+    :return: Returns the paths of the png files in the order of the frames
+    """
+    if Figure is None:
+        raise ImportError("Exporting the animation requires matplotlib. Please install it with pip install matplotlib.")
+
+    if isinstance(df, str):
+        df = FrameStore.load(df)
+
+    if not isinstance(df, FrameStore):
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError("The expected data type of input data is a dataframe but a {} was provided.".format(type(df)))
+        df = FrameStore(df, headers, id_def, id_att, sport)
+
+    store = df
+
+    if image_url is not None and not os.path.isfile(image_url):
+        raise ValueError("The background image should be a local file but {} was provided.".format(image_url))
+
+    window = [-np.inf if start is None else start, np.inf if end is None else end]
+    if store.sport == 'basketball':
+        window = [-t for t in window]
+
+    positions = np.flatnonzero((store.times >= min(window)) & (store.times <= max(window)))
+
+    if not len(positions):
+        raise ValueError("There are no frames between {} and {}.".format(start, end))
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    paths = [os.path.join(out_dir, 'frame_{:05d}.png'.format(i)) for i in range(len(positions))]
+
+    options = dict(x_range=x_range, y_range=y_range, image=image_url, voronoi=voronoi, convex_hull=convex_hull,
+                   labels=labels, marking_lines=marking_lines, attack=attack, width=width, height=height)
+
+    temp_dir = None
+    if isinstance(store.xy, np.memmap):
+        path = os.path.dirname(store.xy.filename)
+    else:
+        temp_dir = tempfile.mkdtemp(prefix='game_animation_')
+        path = store.save(temp_dir)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    chunks = np.array_split(np.arange(len(positions)), min(len(positions), workers * 4))
+
+    try:
+        if workers == 1:
+            _init_worker(path, options)
+            try:
+                for chunk in chunks:
+                    _render(positions[chunk], [paths[i] for i in chunk])
+            finally:
+                # releases the figure and the memory map of the match
+                _worker.clear()
+
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(path, options)) as executor:
+                list(executor.map(_render, [positions[chunk] for chunk in chunks],
+                                  [[paths[i] for i in chunk] for chunk in chunks]))
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return paths
+
+
+def export_video(paths, video_path, fps=25, ffmpeg='ffmpeg'):
+
+    """
+            Parameters
+    ---------------------------
+    :param paths: Paths of the png files returned by export_frames
+    :param video_path: Path of the video file - the format is taken from the extension (.mp4, .gif, ...)
+    :param fps: Frames per second of the video. Default value is 25.
+    :param ffmpeg: ffmpeg executable. Default value is 'ffmpeg'.
+
+    :return: Returns the path of the video
+    """
+    if shutil.which(ffmpeg) is None:
+        raise ValueError("ffmpeg was not found. Please install ffmpeg or provide the path of the executable.")
+
+    if not len(paths):
+        raise ValueError("There are no frames to assemble into a video.")
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        for path in paths:
+            f.write("file '{}'\nduration {}\n".format(os.path.abspath(path), 1. / fps))
+        f.write("file '{}'\n".format(os.path.abspath(paths[-1])))
+        list_path = f.name
+
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+    if video_path.endswith('.mp4'):
+        command += ['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+    command += ['-r', str(fps), video_path]
+
+    try:
+        subprocess.check_call(command)
+    finally:
+        os.remove(list_path)
+
+    return video_path
+
+
+def export_animation(df, video_path, x_range, y_range, fps=25, keep_frames=False, **kwargs):
+
+    """
+            Parameters
+    ---------------------------
+    :param df: Gets the user defined dataframe, a FrameStore or the path of a converted match
+    :param video_path: Path of the video file
+    :param x_range: Provide x range of the pitch coordinates
+    :param y_range: Provide y range of the pitch coordinates
+    :param fps: Frames per second of the video. Default value is 25.
+    :param keep_frames: (True/False) - Keep the png files next to the video (in <video name>_frames).
+                        Default value is False.
+    :param kwargs: Other parameters of export_frames (headers, ids, start, end, layers, workers, ...)
+
+    :return: Returns the path of the video
+    """
+    out_dir = os.path.splitext(video_path)[0] + '_frames' if keep_frames else tempfile.mkdtemp(prefix='game_animation_')
+
+    try:
+        export_video(export_frames(df, out_dir, x_range, y_range, **kwargs), video_path, fps=fps)
+    finally:
+        if not keep_frames:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    return video_path
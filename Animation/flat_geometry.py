@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+# importing numpy
+import numpy as np
+
+"""
+Geometry is kept as flat float arrays with offset arrays (start of each part, plus the end) instead of
+lists of small arrays. Bokeh draws several polygons with one patch glyph, and several lines with one line
+glyph, when the parts are separated by NaN - so a frame is sent as a single typed array per coordinate.
+
+"""
+
+
+def nan_separated(values, offsets):
+
+    """
+    :param values: Flat array with the coordinates of all the parts
+    :param offsets: Start of each part in values, followed by the end of the last part
+    :return: Returns a single float array with the parts separated by NaN
+    """
+    return np.insert(np.asarray(values, dtype=np.float64), np.asarray(offsets[1:-1], dtype=np.intp), np.nan)
+
+
+def segments(start, end):
+
+    """
+    :param start: Coordinates of the start of each segment
+    :param end: Coordinates of the end of each segment
+    :return: Returns a single float array with the segments separated by NaN
+    """
+    return np.column_stack((start, end, np.full(len(start), np.nan))).ravel()[:-1] if len(start) else np.zeros(0)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# importing numpy
+import numpy as np
+
+
+def _same_column(old, new):
+
+    if len(old) != len(new):
+        return False
+
+    if len(new) and isinstance(new[0], (list, tuple, np.ndarray)):
+        return all(np.array_equal(a, b) for a, b in zip(old, new))
+
+    old, new = np.asarray(old), np.asarray(new)
+
+    # NaN separates the patches and lines of the flat geometry columns
+    if old.dtype.kind == 'f' and new.dtype.kind == 'f':
+        return np.array_equal(old, new, equal_nan=True)
+
+    return np.array_equal(old, new)
+
+
+def changed_columns(sent, data):
+
+    """
+            Parameters
+    ---------------------------
+    :param sent: Columns that were last sent to the browser
+    :param data: New columns for the source
+
+    :return: Returns None when the data has to be replaced (different columns or a column changed length),
+             otherwise the names of the columns that changed.
+    """
+    if set(sent) != set(data):
+        return None
+
+    if any(len(sent[name]) != len(column) for name, column in data.items()):
+        return None
+
+    return [name for name, column in data.items() if not _same_column(sent[name], column)]
+
+
+class SourceUpdater(object):
+
+    """
+            Parameters
+    ---------------------------
+    :param source: ColumnDataSource to be updated
+    :param delta: (True/False) - Send only the changes. If False, the data is always replaced.
+
+    Sends only what changed in a frame - columns that didn't change (player ids, colors) are not sent again and
+    the columns that changed are sent together in one data update, as binary buffers. The data is only replaced
+    when the shape of the geometry changes (a column changed length).
+
+    ColumnDataSource.patch is not used - a patch is sent as json text, which is larger than the binary
+    buffer of the whole column for the float columns of a frame.
+
+    """
+
+    def __init__(self, source, delta=True):
+
+        self.source = source
+        self.delta = delta
+        self.sent = dict(source.data)
+
+    def update(self, **data):
+
+        changed = changed_columns(self.sent, data) if self.delta else None
+
+        if changed is None:
+            self.source.data = data
+
+        elif changed:
+            self.source.data.update({name: data[name] for name in changed})
+
+        self.sent = data
+
+        return changed
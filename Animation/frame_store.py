@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+# importing pandas and numpy
+import numpy as np
+import pandas as pd
+
+TEAM_DEF, TEAM_ATT, TEAM_OTHER = 0, 1, 2
+
+
+def _encode(values):
+
+    """
+    :return: Returns the integer code of each value and the unique values (missing values are a value too)
+    """
+    codes, uniques = pd.factorize(values, sort=False)
+    uniques = np.asarray(uniques, dtype=object)
+
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(uniques), codes)
+        uniques = np.append(uniques, np.nan)
+
+    return codes, uniques
+
+
+def _encode_names(uniques):
+
+    """
+    :return: Returns the code of the string of each unique value and the unique strings - values with the same
+             string (1 and '1') get the same code, same as grouping on the strings
+    """
+    codes, names = pd.factorize(np.array([str(value) for value in uniques], dtype=object), sort=False)
+
+    return codes, np.asarray(names, dtype=object)
+
+
+class FrameStore(object):
+
+    """
+            Parameters
+    ---------------------------
+    :param df: Gets the user defined dataframe
+    :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
+    :param id_def: Provide id of defending team
+    :param id_att: Provide id of attacking team
+    :param sport: (football/basketball) - For basketball the time is converted to negative, same as the slider.
+
+    Compact columnar store of a match, built once and shared by make_plot, player_marking and marking_stats.
+
+    times - (frames,) sorted frame times
+    xy - (frames, players, 2) float32 player locations. NaN when a player is missing from a frame.
+    player_ids - (players,) player ids as strings. Players of other teams (ball) have " " as id.
+    team_codes - (players,) 0 for defending team, 1 for attacking team and 2 for any other id (ball).
+
+    Players are ordered by team (defending, attacking, other) and player id, so each team is a contiguous
+    slice of the players axis and the team arrays are views of xy, not copies.
+
+    The position of a player on the players axis is its code - all computation runs on the codes and player_ids
+    is only the lookup table for the labels of the plots.
+
+    """
+
+    def __init__(self, df, headers, id_def, id_att, sport='football'):
+
+        if not isinstance(df, pd.DataFrame):
+            raise ValueError("The expected data type of input data is a dataframe but a {} was provided.".format(type(df)))
+
+        if sport not in ['football', 'basketball']:
+            raise ValueError("Only football/basketball in accepted as input for sport type, but {} was provided.".format(sport))
+
+        all_team = pd.DataFrame(df, columns=headers)
+
+        x = pd.to_numeric(all_team['x']).values
+        y = pd.to_numeric(all_team['y']).values
+        time = pd.to_numeric(all_team['time']).values
+
+        if sport == 'basketball':
+            time = - time
+
+        """
+        Team and player ids are encoded once into integer codes - the strings are only built for the unique ids,
+        and every (team, player) gets a code in the order of team code, player id and team id
+
+        """
+        team_rows, team_uniques = _encode(all_team['team_id'])
+        player_rows, player_uniques = _encode(all_team['player_id'])
+
+        team_uniques_code = np.where((pd.Series(team_uniques) == id_def).values, TEAM_DEF,
+                                     np.where((pd.Series(team_uniques) == id_att).values, TEAM_ATT, TEAM_OTHER))
+        team_code = team_uniques_code[team_rows]
+
+        if not (team_code == TEAM_DEF).any():
+            raise ValueError("Defending team ID is not valid. Please enter a valid team ID")
+
+        elif not (team_code == TEAM_ATT).any():
+            raise ValueError("Attacking team ID is not valid. Please enter a valid team ID")
+
+        team_name_codes, team_names = _encode_names(team_uniques)
+        player_name_codes, player_names = _encode_names(player_uniques)
+
+        keys = (team_code.astype(np.int64) * len(team_names) + team_name_codes[team_rows]) * len(player_names) + \
+            player_name_codes[player_rows]
+        entities, codes = np.unique(keys, return_inverse=True)
+
+        entity_code, entity_player = np.divmod(entities, len(player_names))
+        entity_code, entity_team = np.divmod(entity_code, len(team_names))
+
+        order = np.lexsort((team_names[entity_team], player_names[entity_player], entity_code))
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        codes = rank[codes.ravel()]
+
+        self.id_def, self.id_att, self.sport = id_def, id_att, sport
+        self.team_codes = entity_code[order].astype(np.int8)
+        self.player_ids = np.where(self.team_codes == TEAM_OTHER, " ", player_names[entity_player[order]]).astype(object)
+
+        self.times = np.unique(time)
+
+        frames = np.searchsorted(self.times, time)
+
+        self.xy = np.full((len(self.times), len(self.player_ids), 2), np.nan, dtype=np.float32)
+        self.xy[frames, codes, 0] = x
+        self.xy[frames, codes, 1] = y
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+
+        """
+        :return: Returns the memory used by the arrays of the store - a memory-mapped store only holds the time axis
+        """
+        if isinstance(self.xy, np.memmap):
+            return self.times.nbytes
+
+        return self.xy.nbytes + self.times.nbytes
+
+    def save(self, path):
+
+        """
+        :param path: Directory to write the match to
+
+        Writes the match in a binary layout - xy.dat is the raw (frames, players, 2) float32 array that can be
+        memory-mapped, times.npy is the time axis and meta.json has the ids, teams and the shape of the array.
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        xy = np.memmap(os.path.join(path, 'xy.dat'), dtype=np.float32, mode='w+', shape=self.xy.shape)
+        xy[:] = self.xy
+        xy.flush()
+        del xy
+
+        np.save(os.path.join(path, 'times.npy'), self.times)
+
+        meta = dict(shape=list(self.xy.shape), id_def=self.id_def, id_att=self.id_att, sport=self.sport,
+                    player_ids=[str(player_id) for player_id in self.player_ids],
+                    team_codes=[int(team_code) for team_code in self.team_codes])
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        return path
+
+    @classmethod
+    def load(cls, path, mode='r'):
+
+        """
+        :param path: Directory the match was saved to with save
+        :param mode: Mode of the memory map of the locations - 'r' (read only) or 'c' (copy on write)
+
+        Opens the match without reading the locations - xy is a numpy memmap, so only the frames that are
+        actually used are read from the disk.
+        """
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        return cls.from_arrays(np.load(os.path.join(path, 'times.npy')),
+                               np.memmap(os.path.join(path, 'xy.dat'), dtype=np.float32, mode=mode,
+                                         shape=tuple(meta['shape'])),
+                               meta['player_ids'], meta['team_codes'],
+                               tuple(meta['id_def']) if isinstance(meta['id_def'], list) else meta['id_def'],
+                               tuple(meta['id_att']) if isinstance(meta['id_att'], list) else meta['id_att'],
+                               meta['sport'])
+
+    @classmethod
+    def from_arrays(cls, times, xy, player_ids, team_codes, id_def, id_att, sport='football'):
+
+        """
+        :param times: (frames,) sorted frame times
+        :param xy: (frames, players, 2) float32 player locations
+        :param player_ids: (players,) player ids
+        :param team_codes: (players,) team codes
+        :param id_def: Id of defending team
+        :param id_att: Id of attacking team
+        :param sport: (football/basketball) - times of basketball are already negative
+
+        :return: Returns a store of the arrays, without copying them
+        """
+        store = cls.__new__(cls)
+
+        store.id_def, store.id_att, store.sport = id_def, id_att, sport
+        store.player_ids = np.array(player_ids, dtype=object)
+        store.team_codes = np.array(team_codes, dtype=np.int8)
+
+        store.times = np.asarray(times)
+        store.xy = xy
+
+        return store
+
+    def team(self, team_code):
+
+        """
+        :param team_code: 0 for defending team, 1 for attacking team and 2 for others
+        :return: Returns the slice of the players axis for the team
+        """
+        players = np.flatnonzero(self.team_codes == team_code)
+
+        if not len(players):
+            return slice(0, 0)
+
+        return slice(players[0], players[-1] + 1)
+
+    def nearest(self, time):
+
+        """
+        :param time: Any time, for example the value of the slider
+        :return: Returns the position of the frame closest to the time (the earlier frame on a tie), found with a
+                 binary search over the sorted times, so the lookup works with irregular sampling, gaps and float
+                 times. -1 only if the store has no frames.
+        """
+        pos = int(np.searchsorted(self.times, time))
+
+        if pos == len(self.times):
+            return pos - 1
+
+        if pos > 0 and time - self.times[pos - 1] <= self.times[pos] - time:
+            return pos - 1
+
+        return pos
+
+    def frame(self, position, team_code=None):
+
+        """
+        :param position: Position of the frame
+        :param team_code: Optionally return only the players of a team
+        :return: Returns the locations (players, 2) and the player positions (players,) of the players in the frame
+        """
+        players = np.arange(len(self.player_ids)) if team_code is None else \
+            np.arange(len(self.player_ids))[self.team(team_code)]
+        xy = self.xy[position, players]
+        present = ~np.isnan(xy[:, 0])
+
+        return xy[present], players[present]
+
+
+def convert_match(df, path, headers, id_def, id_att, sport='football'):
+
+    """
+            Parameters
+    ---------------------------
+    :param df: Gets the user defined dataframe or the path of a csv file
+    :param path: Directory to write the match to
+    :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
+    :param id_def: Provide id of defending team
+    :param id_att: Provide id of attacking team
+    :param sport: (football/basketball)
+
+    Converts tracking data to the binary layout of FrameStore.save. The match can then be opened near instantly
+    with FrameStore.load(path), or by giving the path to make_plot / player_marking in place of the dataframe.
+
+    :return: Returns the path
+    """
+    if isinstance(df, str):
+        df = pd.read_csv(df)
+
+    return FrameStore(df, headers, id_def, id_att, sport).save(path)
@@ -5,6 +5,8 @@
 # ignore warnings
 import warnings
 import sys
+from collections import OrderedDict
+from time import perf_counter
 
 # importing pandas and numpy
 import numpy as np
@@ -13,16 +15,27 @@ import pandas as pd
 # importing bokeh and its related functions
 from bokeh.io import curdoc
 from bokeh.layouts import row, widgetbox,column
-from bokeh.models import ColumnDataSource, LabelSet, CustomJS, Title
+from bokeh.models import ColumnDataSource, LabelSet, CustomJS, Title, LinearColorMapper
 from bokeh.models.widgets import Slider, Paragraph, Button, CheckboxButtonGroup
 from bokeh.plotting import figure
+from bokeh.palettes import Category20
 
-# importing convexhull and voronoi from scipy
-from scipy.spatial import ConvexHull, Voronoi
+# importing convexhull from scipy
+from scipy.spatial import ConvexHull
 
 sys.path.append('/Game_Animation/Animation/')
 
-from Animation.patches_from_voronoi import patches_from_voronoi
+from Animation.frame_store import FrameStore, TEAM_DEF, TEAM_ATT
+from Animation.travel_distance import distance_covered
+from Animation.physical_metrics import player_kinematics
+from Animation.voronoi_cache import VoronoiCache
+from Animation.pitch_control import ControlCache, CONTROL_MODES, NO_OWNER
+from Animation.frame_delta import SourceUpdater
+from Animation.playback_clock import PlaybackClock
+from Animation.resample import resample
+from Animation.match_cache import MatchCache, SHARED_CACHE, shared_store
+from Animation.stage_timer import StageTimer, profile_stats
+from Animation.client_playback import playback_js, window_frames, window_hulls, HULL_JS
 
 warnings.filterwarnings("ignore")
 
@@ -34,13 +47,17 @@ if sys.version_info[0] < 3:
 
 def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
               image_url,
-              sport='football', anim_speed=50, show_dist_speed=False):
+              sport='football', anim_speed=50, show_dist_speed=False,
+              precompute_voronoi=False, voronoi_cache_size=5000, workers=None,
+              client_playback=False, client_window=500, playback_speed=1, drop_frames=True,
+              profile=False, profile_panel=False, profile_log=None, shared_cache=False,
+              resample_frames=False, pitch_control=False, control_resolution=1, control_scale=None):
 
     """
             Parameters
     ---------------------------
     :param doc: Plots the graph
-    :param df: Gets the user defined dataframe
+    :param df: Gets the user defined dataframe, a FrameStore or the path of a converted match
     :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
 
     {x, y - int/float - Player location coordinates x and y
@@ -60,6 +77,35 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
     :param anim_speed: Provide speed of animation - milliseconds
     :param show_dist_speed: Turn on/off plotting speed and distance. Default value is False.
                         Note- Turning on speed and distance plot could make animation rending slow.
+    :param precompute_voronoi: (True/False/(start, end)) - Compute the voronoi for every frame (or for the frames
+                        between start and end game time) in parallel at load. Default value is False.
+                        Only the first voronoi_cache_size frames are precomputed - when the match (or the window)
+                        is longer than the cache, the frames after them are computed when they are played.
+    :param voronoi_cache_size: Maximum number of frames of voronoi kept in the cache. Default value is 5000.
+    :param workers: Number of processes used to precompute the voronoi. Defaults to the number of cores.
+    :param client_playback: (True/False) - Play the animation in the browser. Locations and convex hulls of a window of
+                        frames are sent once and played by a javascript timer, so the server only works when the
+                        slider is moved or the next window is needed. Voronoi and the speed and distance plots are
+                        updated when the animation is paused. Default value is False.
+    :param client_window: Number of frames sent to the browser at once for client playback. Default value is 500.
+    :param playback_speed: Playback speed multiplier - 0.5 plays at half speed, 2 at twice the speed. Default value is 1.
+    :param drop_frames: (True/False) - Skip frames when the server falls behind so the playback keeps to real time.
+                        If False, every frame is drawn. Default value is True.
+    :param profile: (True/False/StageTimer) - Time each stage of the slider update (frame, voronoi, convex hull,
+                        distance, send). Pass a StageTimer to read the stats from outside the app with timer.stats().
+                        Default value is False.
+    :param profile_panel: (True/False) - Show the stage timings (ms) below the plot. Default value is False.
+    :param profile_log: Path of a log file the stage timings are appended to every 10 seconds. Default value is None.
+    :param shared_cache: (True/False/MatchCache) - Share the preprocessed match (FrameStore, voronoi and distances) between
+                        all the sessions of the bokeh server process that open the same match. Default value is False.
+    :param resample_frames: (True/False) - Resample the match to one frame per slider step, so that the slider step
+                        doesn't have to match the spacing of the data. Default value is False.
+    :param pitch_control: (False/'team'/'player') - Add a pitch control layer that colors every cell of a grid over
+                        the pitch by the team (or the player) nearest to it. Default value is False.
+    :param control_resolution: Size of a cell of the pitch control grid, in units of the coordinates. Default value is 1.
+    :param control_scale: Distance weighting of team pitch control - the cells are shaded by the difference between
+                        the distance of the nearest player of each team instead of only taking the nearest team.
+                        Default value is None.
 
     :return: Returns the animation plot
 
@@ -70,7 +116,7 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
     ---------------------------
         
     """
-    if not isinstance(df, pd.DataFrame):
+    if not isinstance(df, (pd.DataFrame, FrameStore, str)):
         raise ValueError("The expected data type of input data is a dataframe but a {} was provided.".format(type(df)))
 
     accept_dtypes_id = [int, float, str, tuple]
@@ -98,117 +144,185 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
     if sport not in ['football', 'basketball']:
         raise ValueError("Only football/basketball in accepted as input for sport type, but {} was provided.".format(sport))
 
+    if not isinstance(precompute_voronoi, (bool, list, tuple)) or \
+            (isinstance(precompute_voronoi, (list, tuple)) and len(precompute_voronoi) != 2):
+        raise ValueError("The expected value for precompute_voronoi is True/False or a (start, end) time window "
+                         "but {} was provided.".format(precompute_voronoi))
+
+    if not isinstance(client_window, int) or client_window < 1:
+        raise ValueError("The expected value for client_window is a positive integer but {} was provided.".format(client_window))
+
+    if not isinstance(profile, (bool, StageTimer)):
+        raise ValueError("The expected value for profile is True/False or a StageTimer but {} was provided.".format(profile))
+
+    if not isinstance(shared_cache, (bool, MatchCache)):
+        raise ValueError("The expected value for shared_cache is True/False or a MatchCache but {} was provided.".format(shared_cache))
+
+    if pitch_control is not False and pitch_control not in CONTROL_MODES:
+        raise ValueError("Only False/team/player in accepted as pitch_control, but {} was provided.".format(pitch_control))
+
     if not isinstance(image_url, list):
         image_url = [image_url]
 
-    all_team = pd.DataFrame(df, columns=headers)
+    """
+       The match is held in one FrameStore - (frames, players, 2) locations and a sorted time axis, so that
+       every frame lookup is a binary search instead of a scan of the match. A FrameStore can also be passed
+       directly, to share one copy of the match between plots, or the path of a match written with
+       convert_match, which is opened as a memory map.
 
-    all_team['x'] = pd.to_numeric(all_team['x'])
-    all_team['y'] = pd.to_numeric(all_team['y'])
-    all_team['time'] = pd.to_numeric(all_team['time'])
-    all_team['player_id'] = all_team['player_id'].apply(str)
+    """
+    cache = None
 
-    all_team['team_id'] = np.where(((all_team['team_id'] != id_att) & (all_team['team_id'] != id_def)), -99, all_team['team_id'])
-    all_team['player_id'] = np.where(((all_team['team_id'] != id_att) & (all_team['team_id'] != id_def)), " ", all_team['player_id'])
+    if shared_cache is not False:
+        cache = SHARED_CACHE if shared_cache is True else shared_cache
+        match, store = shared_store(df, headers, id_def, id_att, sport, cache)
+        sport = store.sport
 
-    if sport == 'basketball':
-        all_team['time'] = - all_team['time']
-        all_team = all_team.sort_values(['time', 'team_id', 'player_id'], ascending=[False, False, True]).reset_index(
-            drop=True)
     else:
-        all_team['time'] = all_team['time']
-        all_team = all_team.sort_values(['time', 'team_id', 'player_id'], ascending=[True, False, True]).reset_index(
-            drop=True)
+        if isinstance(df, str):
+            df = FrameStore.load(df)
+
+        if isinstance(df, FrameStore):
+            store = df
+            sport = store.sport
+        else:
+            store = FrameStore(df, headers, id_def, id_att, sport)
 
-    team_def = all_team[all_team.team_id == id_def]
-    team_att = all_team[all_team.team_id == id_att]
+    def shared(name, build):
 
-    if team_def.empty:
-        raise ValueError("Defending team ID is not valid. Please enter a valid team ID")
+        # per match values are built once per process when the cache is shared, otherwise once per session
+        return build() if cache is None else cache.get((match, name), build)
 
-    elif team_att.empty:
-        raise ValueError("Attacking team ID is not valid. Please enter a valid team ID")
+    """
+       Optionally the match is resampled to one frame per slider step - players are interpolated between the
+       frames of low rate feeds and high rate feeds are decimated.
+
+    """
+    if resample_frames:
+        store = shared(('resample', slider_steps), lambda: resample(store, slider_steps))
+        if cache is not None:
+            match = (match, 'resample', slider_steps)
 
-    current_time = all_team['time'].min()
+    def_players = store.team(TEAM_DEF)
+    att_players = store.team(TEAM_ATT)
+
+    if isinstance(profile, StageTimer):
+        timer = profile
+    else:
+        timer = StageTimer(enabled=profile or profile_panel or profile_log is not None)
+
+    colors = np.array(['dodgerblue', 'orangered', 'gold'])[store.team_codes]
+
+    def get_frame(position):
+
+        if client_playback:
+            frame_xy, players = np.asarray(store.xy[position]), np.arange(len(store.player_ids))
+        else:
+            frame_xy, players = store.frame(position)
 
-    coord_x = all_team[all_team.time == current_time]['x']
-    coord_y = all_team[all_team.time == current_time]['y']
+        return frame_xy[:, 0], frame_xy[:, 1], store.player_ids[players], colors[players]
 
-    vor_points = list(zip(coord_x, coord_y))
-    vor = Voronoi(vor_points)
-    x_patch, y_patch, x_vor_ls, y_vor_ls = patches_from_voronoi(vor)
+    current_time = store.times[0]
+    current_position = 0
+
+    coord_x, coord_y, player_id, c = get_frame(current_position)
 
     """
-       Create the convex hull for the coordinates
+       Voronoi of each frame is read from a bounded cache. Optionally all the frames (or a time window)
+       are computed in parallel at load, so that playback and scrubbing don't compute any voronoi.
 
     """
-    def get_convex_hull(team_def, team_att, current_time):
+    voronoi_cache = shared(('voronoi', voronoi_cache_size), lambda: VoronoiCache(voronoi_cache_size))
 
-        team_att_t = np.vstack((team_att[team_att.time == current_time].x, team_att[team_att.time == current_time].y)).T
-        team_def_t = np.vstack((team_def[team_def.time == current_time].x, team_def[team_def.time == current_time].y)).T
+    if precompute_voronoi is not False:
+        voronoi_positions = np.arange(len(store))
 
-        hull = ConvexHull(team_att_t)
-        hull2 = ConvexHull(team_def_t)
+        if isinstance(precompute_voronoi, (list, tuple)):
+            window = [-t for t in precompute_voronoi] if sport == 'basketball' else precompute_voronoi
+            voronoi_positions = voronoi_positions[(store.times >= min(window)) & (store.times <= max(window))]
 
-        team_att_ch_x = team_att_t[hull.vertices, 0]
-        team_att_ch_y = team_att_t[hull.vertices, 1]
+        voronoi_positions = [position for position in voronoi_positions
+                             if store.times[position] not in voronoi_cache][:voronoi_cache_size]
 
-        team_def_ch_x = team_def_t[hull2.vertices, 0]
-        team_def_ch_y = team_def_t[hull2.vertices, 1]
+        voronoi_cache.precompute(store.times[voronoi_positions],
+                                 [store.frame(position)[0] for position in voronoi_positions], workers=workers)
 
-        return team_att_ch_x, team_att_ch_y, team_def_ch_x, team_def_ch_y
+    """
+       Pitch control of each frame is a raster computed on a grid for a chunk of frames at once, and cached.
 
-    source_vor = ColumnDataSource(dict(xs=x_patch, ys=y_patch))
-    source_vor_ls = ColumnDataSource(dict(xs=x_vor_ls, ys=y_vor_ls))
+    """
+    if pitch_control is not False:
+        control_cache = shared(('control', pitch_control, tuple(x_range), tuple(y_range), control_resolution,
+                                control_scale),
+                               lambda: ControlCache(store, x_range, y_range, control_resolution, pitch_control,
+                                                    control_scale, maxsize=voronoi_cache_size))
 
-    team_att_ch_x, team_att_ch_y, team_def_ch_x, team_def_ch_y = get_convex_hull(team_def, team_att, current_time)
+    """
+       Create the convex hull for the coordinates
+
+    """
+    def get_convex_hull(position, team_code):
 
-    player_id = all_team[all_team['time'] == current_time]['player_id']
+        team_t = store.frame(position, team_code)[0]
 
-    c = (['dodgerblue']*len(team_def['player_id'].unique()) + ['orangered']*len(team_att['player_id'].unique()) + ['gold'])
+        hull = ConvexHull(team_t)
 
-    source_coord = ColumnDataSource(data=dict(x=coord_x, y=coord_y, player_id=player_id, color=c))
-    source_ch_att = ColumnDataSource(data=dict(xc=team_att_ch_x, yc=team_att_ch_y))
-    source_ch_def = ColumnDataSource(data=dict(ax=team_def_ch_x, ay=team_def_ch_y))
+        return team_t[hull.vertices, 0], team_t[hull.vertices, 1]
 
     """
-    Below code for travel distance and speed taken from 
-    http://savvastjortjoglou.com/nba-play-by-play-movements.html and modified accordingly
-    
+       Layers that are hidden are not computed. The state of the toggles is mirrored to the server and a layer is
+       computed for the current frame when it is turned on. The voronoi and the convex hulls start hidden, the
+       speed and distance plots are only computed with show_dist_speed.
+
     """
+    layers = dict(voronoi=False, hull_att=False, hull_def=False, control=False, stats=show_dist_speed)
 
-    def travel_dist(player_locations):
+    source_vor = ColumnDataSource(dict(x=[], y=[]))
+    source_vor_ls = ColumnDataSource(dict(x=[], y=[]))
+    source_control = ColumnDataSource(dict(image=[]))
 
-        diff = np.diff(player_locations, axis=0)
+    source_coord = ColumnDataSource(data=dict(x=coord_x, y=coord_y, player_id=player_id, color=c))
+    source_ch_att = ColumnDataSource(data=dict(xc=[], yc=[]))
+    source_ch_def = ColumnDataSource(data=dict(ax=[], ay=[]))
 
-        dist = np.sqrt((diff ** 2).sum(axis=1))
+    """
+    Below code for travel distance and speed taken from 
+    http://savvastjortjoglou.com/nba-play-by-play-movements.html and modified accordingly.
+    The path of each player is integrated once (player_kinematics), so the distance covered until any frame is
+    a lookup.
 
-        return np.round(dist.sum())
+    """
+    def_ids, att_ids = store.player_ids[def_players], store.player_ids[att_players]
 
-    def get_distance(team_def, team_att, i):
+    if show_dist_speed:
+        # the kinematics of the match are also the input of physical_metrics
+        kinematics = shared('kinematics', lambda: player_kinematics(store.xy, store.times))
 
-        if sport == 'football':
-            team_def_k = team_def[(team_def.time >= 0) & (team_def.time <= i)]
-        elif sport =='basketball':
-            team_def_k = team_def[(team_def.time >= team_def.time.min()) & (team_def.time <= i)]
-
-        def_dist = team_def_k.groupby('player_id')[['x','y']].apply(travel_dist).values
-        avg_speed_def = np.abs(np.round((def_dist / (i - team_def.time.min())), 2))
+    def get_distance(i):
 
         if sport == 'football':
-            team_att_k = team_att[(team_att.time >= 0) & (team_att.time <= i)]
+            start = 0
         elif sport == 'basketball':
-            team_att_k = team_att[(team_att.time >= team_def.time.min()) & (team_att.time <= i)]
+            start = store.times[0]
+
+        dist = distance_covered(kinematics.distance, store.times, start, i)
+
+        def_dist = np.round(dist[def_players])
+        avg_speed_def = np.abs(np.round((def_dist / (i - store.times[0])), 2))
 
-        def_dist_att = team_att_k.groupby('player_id')[['x','y']].apply(travel_dist).values
-        avg_speed_att = np.abs(np.round((def_dist_att / (i - team_att.time.min())), 2))
+        def_dist_att = np.round(dist[att_players])
+        avg_speed_att = np.abs(np.round((def_dist_att / (i - store.times[0])), 2))
 
         return def_dist, avg_speed_def, def_dist_att, avg_speed_att
 
-    def_dist, avg_speed_def, def_dist_att, avg_speed_att = get_distance(team_def, team_att, current_time)
+    if show_dist_speed:
+        def_dist, avg_speed_def, def_dist_att, avg_speed_att = get_distance(current_time)
+    else:
+        def_dist, avg_speed_def = np.zeros(len(def_ids)), np.zeros(len(def_ids))
+        def_dist_att, avg_speed_att = np.zeros(len(att_ids)), np.zeros(len(att_ids))
 
-    source_def_params = ColumnDataSource(data=dict(x=team_def.player_id.unique(), y=def_dist, speed=avg_speed_def))
-    source_att_params = ColumnDataSource(data=dict(x=team_att.player_id.unique(), y=def_dist_att, speed=avg_speed_att))
+    source_def_params = ColumnDataSource(data=dict(x=def_ids, y=def_dist, speed=avg_speed_def))
+    source_att_params = ColumnDataSource(data=dict(x=att_ids, y=def_dist_att, speed=avg_speed_att))
 
 
     """
@@ -238,6 +352,21 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
 
     plot.image_url(url=image_url, x=image_min_x, y=image_min_y, w=image_max_x, h=image_max_y, anchor="bottom_left")
 
+    # pitch control is drawn over the pitch and under the players
+    if pitch_control == 'team':
+        # from the defending team (0) to the attacking team (254), cells without players (255) are not drawn
+        blend = np.linspace(0, 1, 255)[:, None]
+        palette = ['#%02x%02x%02x' % tuple(color) for color in
+                   np.round((1 - blend) * [30, 144, 255] + blend * [255, 69, 0]).astype(int)]
+        control_mapper = LinearColorMapper(palette=palette, low=0, high=NO_OWNER - 1, high_color=(0, 0, 0, 0))
+    else:
+        palette = list(Category20[20] * (len(store.player_ids) // 20 + 1))[:len(store.player_ids)]
+        control_mapper = LinearColorMapper(palette=palette, low=-.5, high=len(palette) - .5, high_color=(0, 0, 0, 0))
+
+    glyph_control = plot.image(image='image', source=source_control, x=min(x_range), y=min(y_range),
+                               dw=max(x_range) - min(x_range), dh=max(y_range) - min(y_range),
+                               color_mapper=control_mapper, global_alpha=.4, visible=False)
+
     plot.scatter('x', 'y', source=source_coord, size=20, fill_color='color')
 
     labels = LabelSet(x='x', y='y', text='player_id',
@@ -343,66 +472,144 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
 
     avg_speed_att.add_layout(labels_speed_red_att)
 
-    slider_start = all_team.time.unique().min()
-    slider_end = all_team.time.unique().max()
+    slider_start = store.times[0]
+    slider_end = store.times[-1]
     game_time = Slider(title="Game Time (seconds)", value=slider_start,
                        start=slider_start, end=slider_end, step=slider_steps)
 
     """
-       Update the figure every time slider is updated.
+       Update the figure every time slider is updated. Only the columns that changed are sent to the browser.
+       With client playback the browser changes the sources too, so the data is always replaced.
     """
-    def update_data(attrname, old, new):
-
-        slider_value = np.round(game_time.value, 2)
+    update_coord, update_vor, update_vor_ls, update_ch_att, update_ch_def, update_def_params, update_att_params = \
+        [SourceUpdater(source, delta=not client_playback) for source in
+         [source_coord, source_vor, source_vor_ls, source_ch_att, source_ch_def, source_def_params, source_att_params]]
+
+    # the raster is a single image, it is replaced every frame
+    update_control = SourceUpdater(source_control, delta=False)
+
+    def get_layers(position, names):
+
+        """
+        :return: Returns the new data of the sources of the given layers for the frame
+        """
+        data = OrderedDict()
+
+        if 'voronoi' in names:
+            with timer.stage('voronoi'):
+                x_patch, y_patch, x_vor_ls, y_vor_ls = voronoi_cache.get(store.times[position],
+                                                                         store.frame(position)[0])
+            data[update_vor] = dict(x=x_patch, y=y_patch)
+            data[update_vor_ls] = dict(x=x_vor_ls, y=y_vor_ls)
+
+        if 'control' in names:
+            with timer.stage('pitch_control'):
+                data[update_control] = dict(image=[control_cache.get(position)])
+
+        if 'hull_att' in names or 'hull_def' in names:
+            with timer.stage('convex_hull'):
+                if 'hull_att' in names:
+                    data[update_ch_att] = dict(zip(['xc', 'yc'], get_convex_hull(position, TEAM_ATT)))
+                if 'hull_def' in names:
+                    data[update_ch_def] = dict(zip(['ax', 'ay'], get_convex_hull(position, TEAM_DEF)))
+
+        if 'stats' in names:
+            with timer.stage('distance'):
+                def_dist, avg_speed_def, def_dist_att, avg_speed_att = get_distance(store.times[position])
+            data[update_def_params] = dict(x=def_ids, y=def_dist, speed=avg_speed_def)
+            data[update_att_params] = dict(x=att_ids, y=def_dist_att, speed=avg_speed_att)
+
+        return data
 
-        coord_x = all_team[all_team.time == slider_value]['x']
-        coord_y = all_team[all_team.time == slider_value]['y']
+    def update_data(attrname, old, new):
 
-        vor_points = list(zip(coord_x, coord_y))
-        vor = Voronoi(vor_points)
-        x_patch, y_patch, x_vor_ls, y_vor_ls = patches_from_voronoi(vor)
+        # the slider snaps to the nearest frame, so any frame spacing works
+        position = store.nearest(game_time.value)
 
-        source_vor.data = dict(xs=x_patch, ys=y_patch)
-        source_vor_ls.data = dict(xs=x_vor_ls, ys=y_vor_ls)
+        with timer.stage('total'):
 
-        team_att_ch_x, team_att_ch_y, team_def_ch_x, team_def_ch_y = get_convex_hull(team_def, team_att, slider_value)
+            with timer.stage('frame'):
+                coord_x, coord_y, player_id, c = get_frame(position)
 
-        source_coord.data = dict(x=coord_x, y = coord_y, player_id=player_id, color=c)
-        source_ch_att.data = dict(xc=team_att_ch_x, yc=team_att_ch_y)
-        source_ch_def.data = dict(ax=team_def_ch_x, ay=team_def_ch_y)
+            data = get_layers(position, [name for name, visible in layers.items() if visible])
 
-        def_dist, avg_speed_def, def_dist_att, avg_speed_att = get_distance(team_def, team_att, slider_value)
+            # the document changes are serialized when the sources are updated
+            with timer.stage('send'):
+                update_coord.update(x=coord_x, y=coord_y, player_id=player_id, color=c)
 
-        source_def_params.data = dict(x=team_def.player_id.unique(), y=def_dist, speed=avg_speed_def)
-        source_att_params.data = dict(x=team_att.player_id.unique(), y=def_dist_att, speed=avg_speed_att)
+                for updater, columns in data.items():
+                    updater.update(**columns)
 
+            if client_playback and not window[0] <= position < window[1]:
+                with timer.stage('client_window'):
+                    load_window(position)
 
     for w in [game_time]:
         w.on_change('value', update_data)
 
+    """
+       Client side playback - send a window of frames to the browser
+    """
+    source_frames = ColumnDataSource(data=dict(time=[], players=[], att_start=[], att_stop=[],
+                                               def_start=[], def_stop=[]))
+    source_frame_xy = ColumnDataSource(data=dict(x=[], y=[]))
+    source_hull_xy = ColumnDataSource(data=dict(x=[], y=[]))
+    window = [0, 0]
+
+    def load_window(position):
+
+        positions, x, y = window_frames(store, position, client_window)
+        att_x, att_y, att_start, att_stop = window_hulls(store, positions, TEAM_ATT, layers['hull_att'])
+        def_x, def_y, def_start, def_stop = window_hulls(store, positions, TEAM_DEF, layers['hull_def'])
+
+        source_frame_xy.data = dict(x=x, y=y)
+        source_hull_xy.data = dict(x=np.concatenate((att_x, def_x)), y=np.concatenate((att_y, def_y)))
+        source_frames.data = dict(time=store.times[positions], players=np.full(len(positions), len(store.player_ids)),
+                                  att_start=att_start, att_stop=att_stop,
+                                  def_start=def_start + len(att_x), def_stop=def_stop + len(att_x))
+
+        window[:] = [positions[0], positions[-1] + 1]
+
+    if client_playback:
+        load_window(current_position)
+
     """
        Animation
     """
     def animate_update():
 
-        time = game_time.value + slider_steps
-        if time > all_team.time.max():
-            time = all_team.time.min()
+        time = clock.tick(game_time.value)
+        if time is None:
+            return
+
+        update_start = perf_counter()
         game_time.value = time
+        clock.record(perf_counter() - update_start)
 
+    clock = PlaybackClock(store.times, slider_steps, anim_speed, speed=playback_speed, drop_frames=drop_frames)
     callback_id = None
 
     def animate():
         global callback_id
         if button.label == '► Play':
             button.label = '❚❚ Pause'
-            callback_id = curdoc().add_periodic_callback(animate_update, anim_speed)
+            clock.start(game_time.value)
+            callback_id = curdoc().add_periodic_callback(animate_update, clock.interval)
         else:
             button.label = '► Play'
             curdoc().remove_periodic_callback(callback_id)
 
     button = Button(label='► Play', width=60)
-    button.on_click(animate)
+
+    if client_playback:
+        button.callback = CustomJS(args=dict(button=button, slider=game_time, frames=source_frames,
+                                             frame_xy=source_frame_xy, hull_xy=source_hull_xy,
+                                             source_coord=source_coord, source_ch_att=source_ch_att,
+                                             source_ch_def=source_ch_def, step=slider_steps, interval=anim_speed,
+                                             speed=playback_speed),
+                                   code=playback_js(HULL_JS))
+    else:
+        button.on_click(animate)
 
     """
        Plot the patches for voronoi and convex hull
@@ -410,13 +617,14 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
     team_att_patch = plot.patch('xc', 'yc', source=source_ch_att, alpha=0, line_width=3, fill_color='orangered')
     team_def_patch = plot.patch('ax', 'ay', source=source_ch_def, alpha=0, line_width=3, fill_color='dodgerblue')
 
-    glyph_vor = plot.patches('xs', 'ys', source=source_vor, alpha=0, line_width=1, fill_color='dodgerblue',
-                             line_color='black')
-    glyph_ls = plot.multi_line('xs', 'ys', source=source_vor_ls, alpha=0, line_width=1, line_color='black')
+    glyph_vor = plot.patch('x', 'y', source=source_vor, alpha=0, line_width=1, fill_color='dodgerblue',
+                           line_color='black')
+    glyph_ls = plot.line('x', 'y', source=source_vor_ls, alpha=0, line_width=1, line_color='black')
 
     checkbox_def = CheckboxButtonGroup(labels=["Team Defend"], width=100)
     checkbox_att = CheckboxButtonGroup(labels=["Team Attack"], width=100)
     checkbox_vor = CheckboxButtonGroup(labels=["Voronoi"], width=100)
+    checkbox_control = CheckboxButtonGroup(labels=["Pitch Control"], width=100, visible=pitch_control is not False)
 
     checkbox_def.callback = CustomJS(args=dict(l0=team_def_patch, checkbox=checkbox_def), code="""
         l0.visible = 0 in checkbox.active;
@@ -433,14 +641,40 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
         l0.glyph.fill_alpha = .1;
         l0.glyph.line_alpha = 1;
         l1.visible = 0 in checkbox.active;
-        l1.glyph.fill_alpha = .1;
         l1.glyph.line_alpha = 1;
         """)
 
+    checkbox_control.callback = CustomJS(args=dict(l0=glyph_control, checkbox=checkbox_control), code="""
+        l0.visible = 0 in checkbox.active;
+        """)
+
+    def toggle_layer(name, checkbox):
+
+        def toggle(attrname, old, new):
+
+            layers[name] = 0 in checkbox.active
+            if not layers[name]:
+                return
+
+            for updater, columns in get_layers(store.nearest(game_time.value), [name]).items():
+                updater.update(**columns)
+
+            # the hulls of the frames already sent to the browser are sent again
+            if client_playback and name in ['hull_att', 'hull_def']:
+                load_window(window[0])
+
+        checkbox.on_change('active', toggle)
+
+    toggle_layer('hull_def', checkbox_def)
+    toggle_layer('hull_att', checkbox_att)
+    toggle_layer('voronoi', checkbox_vor)
+    if pitch_control is not False:
+        toggle_layer('control', checkbox_control)
+
     text_p = Paragraph(text="""Select a team to visualize convex hull""", width=250)
 
     inputs = widgetbox(row(column(game_time, button),
-                           row(column(text_p, row(checkbox_def, checkbox_att)), checkbox_vor)))
+                           row(column(text_p, row(checkbox_def, checkbox_att)), column(checkbox_vor, checkbox_control))))
 
     """
        Plot the speed and distance if true
@@ -450,6 +684,12 @@ def make_plot(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
     else:
         layout = column(row(column(plot, inputs),row(column(plot_distance_def, avg_speed_def),column(plot_distance_att, avg_speed_att))))
 
+    """
+       Stage timings of the slider update
+    """
+    if profile_panel or profile_log is not None:
+        layout = column(layout, profile_stats(doc, timer, profile_panel, profile_log))
+
     doc.add_root(layout)
     doc.title = "Game Animation"
 
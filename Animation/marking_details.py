@@ -17,7 +17,8 @@ from bokeh.layouts import column
 from bokeh.io import output_notebook,show
 from bokeh.palettes import YlOrRd
 
-from scipy.spatial.distance import cdist
+from Animation.frame_store import FrameStore, TEAM_DEF, TEAM_ATT
+from Animation.nearest_marker import chunked_marking_counts, ASSIGNMENTS
 
 output_notebook()
 warnings.filterwarnings("ignore")
@@ -26,12 +27,80 @@ if sys.version_info[0] < 3:
     raise Exception("This app requires Python 3")
 
 
-def marking_stats(df, headers, id_def, id_att, time_steps, attack=True, threshold=0):
+def marking_table(source_ids, target_ids, counts, dist_sum, time_steps, threshold=0):
 
     """
                 Parameters
         ---------------------------
-        :param df: Gets the user defined dataframe
+        :param source_ids: Ids of the players marking
+        :param target_ids: Ids of the players being marked
+        :param counts: Number of frames each source player was closest to each target player (sources x targets)
+        :param dist_sum: Sum of the distances between each source and target player over those frames
+        :param time_steps: Provide the time steps
+        :param threshold: (int) - Pairs marked for less frames than the threshold are not considered
+
+        :return: Returns the dataframe with source_player, closest_player, percent_time, total_time and
+        average_distance of every pair.
+
+    """
+    counts = np.where(counts >= max(threshold, 1), counts, 0)
+    source, target = np.nonzero(counts)
+    pair_counts = counts[source, target]
+
+    marking_percent = pd.DataFrame({'source_player': source_ids[source], 'closest_player': target_ids[target]})
+    marking_percent['percent_time'] = 100 * pair_counts / counts.sum(axis=1)[source].astype(float)
+    marking_percent['total_time'] = pair_counts * time_steps
+    marking_percent['average_distance'] = dist_sum[source, target] / pair_counts
+
+    return marking_percent
+
+
+def store_marking_counts(store, time_steps, attack=True, start_time=None, workers=1, assignment='nearest'):
+
+    """
+                Parameters
+        ---------------------------
+        :param store: FrameStore of the match
+        :param time_steps: Provide the time steps - only frames that are a multiple of time_steps from the
+        start time are considered
+        :param attack:(True/False) - If 'True', then the attacking team is considered players marking
+        :param start_time: Time the time steps are counted from. Defaults to the first frame of the store.
+        :param workers: Number of processes used to compute the marking
+        :param assignment: ('nearest'/'optimal') - How the players marking are paired with the players being marked
+
+        Nearest player for every player in every frame is computed in chunks of frames on the (frames, players, 2)
+        arrays of the store and aggregated into per pair counts and distance sums.
+
+        :return: Returns the source player ids, target player ids, pair counts and pair distance sums.
+
+    """
+    start_time = store.times[0] if start_time is None else start_time
+    frame_steps = (store.times - start_time) / time_steps
+    frames = np.isclose(frame_steps, np.round(frame_steps))
+
+    if frames.all():
+        frames = slice(None)
+
+    def_players, att_players = store.team(TEAM_DEF), store.team(TEAM_ATT)
+    def_xy, att_xy = store.xy[frames, def_players], store.xy[frames, att_players]
+
+    if attack:
+        source_ids, target_ids = store.player_ids[att_players], store.player_ids[def_players]
+        counts, dist_sum = chunked_marking_counts(att_xy, def_xy, workers=workers, assignment=assignment)
+    else:
+        source_ids, target_ids = store.player_ids[def_players], store.player_ids[att_players]
+        counts, dist_sum = chunked_marking_counts(def_xy, att_xy, workers=workers, assignment=assignment)
+
+    return source_ids, target_ids, counts, dist_sum
+
+
+def marking_stats(df, headers, id_def, id_att, time_steps, attack=True, threshold=0, workers=1,
+                  assignment='nearest'):
+
+    """
+                Parameters
+        ---------------------------
+        :param df: Gets the user defined dataframe or a FrameStore of the match
         :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
 
         {x, y - int/float - Player location coordinates x and y
@@ -46,6 +115,11 @@ def marking_stats(df, headers, id_def, id_att, time_steps, attack=True, threshol
         team is considered as players being marked. If 'false' then logic is reversed.
         :param threshold: (int) - Get the threshold to consider players as marked - players who were tagged as marked
         below threshold would not be considered.
+        :param workers: (int) - Number of processes used to compute the marking. The frames are split into chunks
+        that are computed in parallel. Default value is 1 (no parallel processing), None uses all the cores.
+        :param assignment: ('nearest'/'optimal') - 'nearest' pairs each player with the nearest opponent, so two players
+        can mark the same opponent. 'optimal' pairs the players one-to-one with the lowest total distance in each
+        frame. Default value is 'nearest'.
 
         :return: Returns the heat map plot of % of time player being marked.
 
@@ -55,7 +129,7 @@ def marking_stats(df, headers, id_def, id_att, time_steps, attack=True, threshol
     ---------------------------
 
      """
-    if not isinstance(df, pd.DataFrame):
+    if not isinstance(df, (pd.DataFrame, FrameStore)):
         raise ValueError("The expected data type of input data is a dataframe but a {} was provided.".format(type(df)))
 
     accept_dtypes_id = [int, float, str, tuple]
@@ -71,83 +145,131 @@ def marking_stats(df, headers, id_def, id_att, time_steps, attack=True, threshol
     if not isinstance(threshold, int):
         raise ValueError("The expected data type for threshold is a integer but a {} was provided.".format(type(threshold)))
 
-    all_team = pd.DataFrame(df, columns=headers)
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        raise ValueError("The expected value for workers is a positive integer or None but {} was provided.".format(workers))
+
+    if assignment not in ASSIGNMENTS:
+        raise ValueError("Only nearest/optimal in accepted as assignment, but {} was provided.".format(assignment))
+
+    store = df if isinstance(df, FrameStore) else FrameStore(df, headers, id_def, id_att)
+
+    source_ids, target_ids, counts, dist_sum = store_marking_counts(store, time_steps, attack, workers=workers,
+                                                                    assignment=assignment)
+
+    player_marking_percent = marking_table(source_ids, target_ids, counts, dist_sum, time_steps, threshold)
+
+    return plot_marking(player_marking_percent)
+
+
+def marking_stats_stream(chunks, headers, id_def, id_att, time_steps, attack=True, threshold=0,
+                         assignment='nearest'):
+
+    """
+                Parameters
+        ---------------------------
+        :param chunks: Iterator of dataframes with consecutive parts of the match, for example
+        pd.read_csv(path, chunksize=100000). Rows should be ordered by time.
+        :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
+        :param id_def: Provide id of defending team
+        :param id_att: Provide id of attacking team
+        :param time_steps: Provide the time steps
+        :param attack:(True/False) - If 'True', then the attacking team is considered players marking and defending
+        team is considered as players being marked. If 'false' then logic is reversed.
+        :param threshold: (int) - Get the threshold to consider players as marked - players who were tagged as marked
+        below threshold would not be considered.
+        :param assignment: ('nearest'/'optimal') - Same as marking_stats. Default value is 'nearest'.
+
+        Same as marking_stats, but the match is read one chunk at a time. Only the running frame counts and
+        distance sums of each pair of players are kept, so the memory doesn't grow with the length of the match.
+        The last frame of each chunk is held back until the next chunk, as it might continue there.
+
+        :return: Returns the heat map plot of % of time player being marked.
+
+    """
+    accept_dtypes_id = [int, float, str, tuple]
+
+    if type(id_def) not in accept_dtypes_id:
+        raise ValueError("The expected data type for defending team-id is either integer, float "
+                         "or a string but {} was provided.".format(type(id_def)))
+
+    if type(id_att) not in accept_dtypes_id:
+        raise ValueError("The expected data type for defending team-id is either integer, float "
+                         "or a string but {} was provided.".format(type(id_att)))
+
+    if not isinstance(threshold, int):
+        raise ValueError("The expected data type for threshold is a integer but a {} was provided.".format(type(threshold)))
+
+    if assignment not in ASSIGNMENTS:
+        raise ValueError("Only nearest/optimal in accepted as assignment, but {} was provided.".format(assignment))
+
+    # player ids are encoded into codes once - the running totals are (sources x targets) arrays indexed by code
+    source_codes, target_codes = {}, {}
+    totals = dict(counts=np.zeros((0, 0), dtype=np.intp), dist_sum=np.zeros((0, 0)))
+    start_time, carry = None, None
+
+    def encode(codes, player_ids):
+        return np.array([codes.setdefault(player_id, len(codes)) for player_id in player_ids], dtype=np.intp)
 
-    all_team['x'] = pd.to_numeric(all_team['x'])
-    all_team['y'] = pd.to_numeric(all_team['y'])
-    all_team['time'] = pd.to_numeric(all_team['time'])
-    all_team['player_id'] = all_team['player_id'].apply(str)
+    def add_frames(frames):
 
-    all_team['team_id'] = np.where(((all_team['team_id'] != id_att) & (all_team['team_id'] != id_def)), -99,
-                                   all_team['team_id'])
-    all_team['player_id'] = np.where(((all_team['team_id'] != id_att) & (all_team['team_id'] != id_def)), " ",
-                                     all_team['player_id'])
-    all_team = all_team.sort_values(['time', 'team_id', 'player_id'], ascending=[True, False, True]).reset_index(
-        drop=True)
+        store = FrameStore(frames, headers, id_def, id_att)
+        source_ids, target_ids, counts, dist_sum = store_marking_counts(store, time_steps, attack, start_time,
+                                                                        assignment=assignment)
 
-    team_def = all_team[all_team.team_id == id_def]
-    team_att = all_team[all_team.team_id == id_att]
+        source, target = encode(source_codes, source_ids), encode(target_codes, target_ids)
 
-    if team_def.empty:
-        raise ValueError("Defending team ID is not valid. Please enter a valid team ID")
+        grow = ((0, len(source_codes) - totals['counts'].shape[0]), (0, len(target_codes) - totals['counts'].shape[1]))
+        totals['counts'], totals['dist_sum'] = np.pad(totals['counts'], grow), np.pad(totals['dist_sum'], grow)
 
-    elif team_att.empty:
-        raise ValueError("Attacking team ID is not valid. Please enter a valid team ID")
+        totals['counts'][np.ix_(source, target)] += counts
+        totals['dist_sum'][np.ix_(source, target)] += dist_sum
 
-    marking_df = pd.DataFrame()
+    for chunk in chunks:
 
-    for time in range(all_team['time'].min(), all_team['time'].max()+time_steps, time_steps):
+        chunk = pd.DataFrame(chunk, columns=headers)
 
-        team_def_xy = team_def[team_def.time == time]
-        team_att_xy = team_att[team_att.time == time]
+        if chunk.empty:
+            continue
 
-        if attack:
-            columns = team_def_xy['player_id'].values.tolist()
-            index = team_att_xy['player_id'].values.tolist()
-            dist_mat = cdist(team_att_xy[['x', 'y']].values, team_def_xy[['x', 'y']].values)
-            source_x,source_y = team_att_xy['x'].values, team_att_xy['y'].values
-            merge_df = team_def_xy[['player_id', 'x', 'y']]
-        else:
-            columns = team_att_xy['player_id'].values.tolist()
-            index = team_def_xy['player_id'].values.tolist()
-            dist_mat = cdist(team_def_xy[['x', 'y']].values, team_att_xy[['x', 'y']].values)
-            source_x, source_y = team_def_xy['x'].values, team_def_xy['y'].values
-            merge_df = team_att_xy[['player_id', 'x', 'y']]
+        chunk['time'] = pd.to_numeric(chunk['time'])
 
-        dist_df = pd.DataFrame(dist_mat)
-        dist_df.columns = columns
-        dist_df.index = index
-        min_dist = dist_df.min(axis=1)
-        nearest_player = dist_df.idxmin(axis=1)
+        if start_time is None:
+            start_time = chunk['time'].min()
 
-        dist_df['min_distance'] = min_dist
-        dist_df['closest_player'] = nearest_player
-        dist_df['source_player'] = index
-        dist_df['source_x'] = source_x
-        dist_df['source_y'] = source_y
-        dist_df['time'] = [time]*len(dist_df)
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
 
-        lines_x = pd.merge(dist_df, merge_df, left_on='closest_player', right_on='player_id', sort=False) \
-            .rename(columns={'x': 'target_x', 'y': 'target_y'})
+        last_time = chunk['time'].values[-1]
+        carry = chunk[chunk.time == last_time]
 
-        marking_df = marking_df.append(lines_x[['closest_player', 'source_player', 'time', 'min_distance']])
+        if (chunk.time != last_time).any():
+            add_frames(chunk[chunk.time != last_time])
 
-    marking_df = marking_df.groupby(['source_player', 'closest_player']).filter(lambda x: len(x) >= threshold)
+    if carry is not None:
+        add_frames(carry)
 
-    player_groups = marking_df.groupby(['source_player', 'closest_player'])['min_distance']\
-        .mean().reset_index(name='Average Distance')\
-        .sort_values('Average Distance')
+    source_ids, target_ids = np.array(list(source_codes), dtype=object), np.array(list(target_codes), dtype=object)
+    source_order, target_order = np.argsort(source_ids, kind='stable'), np.argsort(target_ids, kind='stable')
 
-    player_marking_percent = marking_df.groupby(['source_player','closest_player'])['time'].count().groupby(level=0)\
-                                .apply(lambda x: 100 * x / float(x.sum())).reset_index(drop=False)
+    source_ids, target_ids = source_ids[source_order], target_ids[target_order]
+    counts = totals['counts'][np.ix_(source_order, target_order)]
+    dist_sum = totals['dist_sum'][np.ix_(source_order, target_order)]
 
-    player_marking_percent['total_time'] = marking_df.groupby(['source_player', 'closest_player']) \
-        .size().reset_index(name='counts')['counts'] * time_steps
+    player_marking_percent = marking_table(source_ids, target_ids, counts, dist_sum, time_steps, threshold)
 
-    player_marking_percent['average_distance'] = marking_df.groupby(['source_player', 'closest_player'])['min_distance'] \
-                                                    .mean().reset_index(name='avg_distance')['avg_distance']
-    player_marking_percent = player_marking_percent.rename(columns={'time':'percent_time'})
+    return plot_marking(player_marking_percent)
 
+
+def plot_marking(player_marking_percent):
+
+    """
+                Parameters
+        ---------------------------
+        :param player_marking_percent: Output dataframe from marking_table
+
+        :return: Returns the heat map plot of % of time player being marked and average distance between players.
+
+    """
     colors = sorted(YlOrRd[9], reverse=True)
     mapper = LogColorMapper(palette=colors, low=player_marking_percent.percent_time.min(),
                                high=player_marking_percent.percent_time.max())
@@ -263,4 +385,3 @@ def marking_stats(df, headers, id_def, id_att, time_steps, attack=True, threshol
     plot_dist.tools.append(hover)
 
     return show(column(plot_time, plot_dist))
-
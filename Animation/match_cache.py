@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+# importing pandas and numpy
+import numpy as np
+import pandas as pd
+
+from Animation.frame_store import FrameStore
+
+"""
+Process wide cache of preprocessed matches - under bokeh serve every session calls make_plot / player_marking
+with the same match. The FrameStore and the per frame geometry (voronoi, cumulative distance) are built by the
+first session and shared, read only, by every other session of the same match in the process.
+
+"""
+
+
+def _nbytes(value):
+
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(part) for part in value)
+
+    if isinstance(value, np.memmap):
+        # pages of a memory map belong to the os page cache, not to the process
+        return 0
+
+    return getattr(value, 'nbytes', 0)
+
+
+def match_key(df, headers=None, id_def=None, id_att=None, sport='football'):
+
+    """
+            Parameters
+    ---------------------------
+    :param df: Dataframe, FrameStore or the path of a converted match
+    :param headers: Headers of the dataframe
+    :param id_def: Id of defending team
+    :param id_att: Id of attacking team
+    :param sport: (football/basketball)
+
+    :return: Returns a hash of the content of the match and the parameters it is preprocessed with. Two sessions
+             that load the same data with the same parameters get the same key.
+    """
+    digest = hashlib.sha1()
+
+    if isinstance(df, str):
+        path = os.path.realpath(df)
+        stat = os.stat(os.path.join(path, 'xy.dat'))
+        digest.update(repr(('path', path, stat.st_size, stat.st_mtime)).encode())
+
+    elif isinstance(df, FrameStore):
+        digest.update(repr(('store', df.id_def, df.id_att, df.sport, list(df.player_ids))).encode())
+        digest.update(np.ascontiguousarray(df.times).tobytes())
+        if isinstance(df.xy, np.memmap):
+            digest.update(repr(os.path.realpath(df.xy.filename)).encode())
+        else:
+            digest.update(np.ascontiguousarray(df.xy).tobytes())
+
+    elif isinstance(df, pd.DataFrame):
+        digest.update(repr(('df', list(headers), id_def, id_att, sport)).encode())
+        digest.update(pd.util.hash_pandas_object(pd.DataFrame(df, columns=headers), index=False).values.tobytes())
+
+    else:
+        raise ValueError("The expected data type of input data is a dataframe but a {} was provided.".format(type(df)))
+
+    return digest.hexdigest()
+
+
+class MatchCache(object):
+
+    """
+            Parameters
+    ---------------------------
+    :param max_bytes: Memory budget of the cache in bytes. Least recently used entries are removed first once the
+                      budget is exceeded. Default value is 2 GB.
+
+    Read only values (stores, geometry) shared by all the sessions of the process. A value is built once - when
+    several sessions ask for the same key at the same time, one builds it and the others wait for it.
+    Values that are removed from the cache stay alive for the sessions that still use them.
+
+    """
+
+    def __init__(self, max_bytes=2 * 2 ** 30):
+
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise ValueError("The expected memory budget is a positive integer but {} was provided.".format(max_bytes))
+
+        self.max_bytes = max_bytes
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    @property
+    def nbytes(self):
+
+        """
+        :return: Returns the memory used by the values of the cache - sizes are measured again every time, as
+                 geometry caches grow while they are used
+        """
+        return sum(_nbytes(value) for value in self._values.values())
+
+    def get(self, key, build):
+
+        """
+        :param key: Key of the value - see match_key
+        :param build: Function without arguments that builds the value if it is not in the cache
+        :return: Returns the cached value
+        """
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+            lock = self._building.setdefault(key, threading.Lock())
+
+        with lock:
+            with self._lock:
+                if key in self._values:
+                    self._values.move_to_end(key)
+                    return self._values[key]
+
+            try:
+                value = build()
+            except BaseException:
+                with self._lock:
+                    self._building.pop(key, None)
+                raise
+
+            # the value is stored before the build lock is dropped, so no other session can miss both
+            with self._lock:
+                self._values[key] = value
+                self._evict(keep=key)
+                self._building.pop(key, None)
+
+        return value
+
+    def _evict(self, keep):
+
+        size = self.nbytes
+
+        for key in list(self._values):
+            if size <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            size -= _nbytes(self._values.pop(key))
+
+    def clear(self):
+
+        with self._lock:
+            self._values.clear()
+
+
+# cache of the process, used by make_plot and player_marking with shared_cache=True
+SHARED_CACHE = MatchCache()
+
+
+def shared_store(df, headers=None, id_def=None, id_att=None, sport='football', cache=None):
+
+    """
+            Parameters
+    ---------------------------
+    :param df: Dataframe, FrameStore or the path of a converted match
+    :param headers: Headers of the dataframe
+    :param id_def: Id of defending team
+    :param id_att: Id of attacking team
+    :param sport: (football/basketball)
+    :param cache: MatchCache to use. Defaults to the cache of the process.
+
+    :return: Returns the key of the match and its FrameStore, built once per process. The locations of a store
+             built from a dataframe are read only.
+    """
+    cache = SHARED_CACHE if cache is None else cache
+    key = match_key(df, headers, id_def, id_att, sport)
+
+    def build():
+
+        if isinstance(df, str):
+            return FrameStore.load(df)
+
+        if isinstance(df, FrameStore):
+            return df
+
+        store = FrameStore(df, headers, id_def, id_att, sport)
+        store.xy.flags.writeable = False
+
+        return store
+
+    return key, cache.get((key, 'store'), build)
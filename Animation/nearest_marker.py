@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+# importing numpy
+import numpy as np
+
+# importing linear_sum_assignment from scipy
+from scipy.optimize import linear_sum_assignment
+
+ASSIGNMENTS = ['nearest', 'optimal']
+
+
+def _distances(source_xy, target_xy):
+
+    """
+    :return: Returns the (frames, source players, target players) distances - inf when a player is missing
+    """
+    diff = source_xy[:, :, None, :] - target_xy[:, None, :, :]
+    dist = np.sqrt((diff ** 2).sum(axis=3))
+    dist[np.isnan(dist)] = np.inf
+
+    return dist
+
+
+def nearest_opponent(source_xy, target_xy, chunk_size=2048):
+
+    """
+            Parameters
+    ---------------------------
+    :param source_xy: Array of shape (frames, source players, 2) - players marking
+    :param target_xy: Array of shape (frames, target players, 2) - players being marked
+    :param chunk_size: Number of frames computed together. Bounds the memory of the distance matrices.
+
+    :return: Returns the distance to the closest target player and the index of that player for every
+             source player in every frame, both of shape (frames, source players). Index is -1 (and distance NaN)
+             when the source player or all the target players are missing from the frame.
+    """
+    n_frames, n_source = source_xy.shape[:2]
+
+    min_dist = np.full((n_frames, n_source), np.nan)
+    closest = np.full((n_frames, n_source), -1, dtype=np.intp)
+
+    if target_xy.shape[1] == 0:
+        return min_dist, closest
+
+    for start in range(0, n_frames, chunk_size):
+        end = start + chunk_size
+
+        dist = _distances(source_xy[start:end], target_xy[start:end])
+
+        idx = dist.argmin(axis=2)
+        d = np.take_along_axis(dist, idx[:, :, None], axis=2)[:, :, 0]
+        found = np.isfinite(d)
+
+        closest[start:end] = np.where(found, idx, -1)
+        min_dist[start:end] = np.where(found, d, np.nan)
+
+    return min_dist, closest
+
+
+def assigned_opponent(source_xy, target_xy, chunk_size=2048):
+
+    """
+            Parameters
+    ---------------------------
+    :param source_xy: Array of shape (frames, source players, 2) - players marking
+    :param target_xy: Array of shape (frames, target players, 2) - players being marked
+    :param chunk_size: Number of frames computed together. Bounds the memory of the distance matrices.
+
+    Same as nearest_opponent, but every target player is marked by at most one source player - the pairs of each
+    frame are the one-to-one matching with the lowest total distance (linear_sum_assignment).
+
+    Only the frames that need it are solved. When no two source players share the same nearest player, the
+    nearest players already are the best matching. A frame with the same locations as the frame before it
+    reuses the matching of that frame.
+
+    :return: Returns the distance to the assigned target player and the index of that player for every
+             source player in every frame, both of shape (frames, source players). Index is -1 (and distance NaN)
+             when the source player is missing from the frame or is left without a target player.
+    """
+    n_frames, n_source = source_xy.shape[:2]
+
+    min_dist = np.full((n_frames, n_source), np.nan)
+    assigned = np.full((n_frames, n_source), -1, dtype=np.intp)
+
+    if target_xy.shape[1] == 0:
+        return min_dist, assigned
+
+    for start in range(0, n_frames, chunk_size):
+        end = min(start + chunk_size, n_frames)
+
+        dist = _distances(source_xy[start:end], target_xy[start:end])
+
+        idx = dist.argmin(axis=2)
+        d = np.take_along_axis(dist, idx[:, :, None], axis=2)[:, :, 0]
+        idx = np.where(np.isfinite(d), idx, -1)
+
+        # frames where two source players share their nearest player
+        ordered = np.sort(idx, axis=1)
+        shared = ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] >= 0)).any(axis=1)
+
+        # a frame that repeats the locations of the frame before it takes its matching
+        source, target = source_xy[start:end], target_xy[start:end]
+        same = np.zeros(end - start, dtype=bool)
+        same[1:] = ((source[1:] == source[:-1]) | (np.isnan(source[1:]) & np.isnan(source[:-1]))).all(axis=(1, 2)) & \
+                   ((target[1:] == target[:-1]) | (np.isnan(target[1:]) & np.isnan(target[:-1]))).all(axis=(1, 2))
+
+        solve = shared.copy()
+        solve[1:] &= ~(same[1:] & shared[:-1])
+
+        complete = np.isfinite(dist).all(axis=(1, 2))
+
+        for frame in np.flatnonzero(solve):
+            idx[frame] = -1
+
+            if complete[frame]:
+                row, col = linear_sum_assignment(dist[frame])
+                idx[frame, row] = col
+                continue
+
+            # missing players are left out of the matching
+            rows = np.flatnonzero(np.isfinite(dist[frame]).any(axis=1))
+            cols = np.flatnonzero(np.isfinite(dist[frame]).any(axis=0))
+
+            row, col = linear_sum_assignment(dist[frame][np.ix_(rows, cols)])
+            idx[frame, rows[row]] = cols[col]
+
+        # repeated frames copy the last solved frame
+        last_solved = np.maximum.accumulate(np.where(solve, np.arange(end - start), 0))
+        repeated = shared & ~solve
+        idx[repeated] = idx[last_solved[repeated]]
+
+        found = idx >= 0
+        d = np.take_along_axis(dist, np.maximum(idx, 0)[:, :, None], axis=2)[:, :, 0]
+
+        assigned[start:end] = idx
+        min_dist[start:end] = np.where(found, d, np.nan)
+
+    return min_dist, assigned
+
+
+def marking_opponent(source_xy, target_xy, assignment='nearest'):
+
+    """
+    :param assignment: ('nearest'/'optimal') - 'nearest' pairs each source player with the nearest target player,
+                       'optimal' with the one-to-one matching of assigned_opponent
+    :return: Returns the output of nearest_opponent or assigned_opponent
+    """
+    if assignment == 'optimal':
+        return assigned_opponent(source_xy, target_xy)
+
+    return nearest_opponent(source_xy, target_xy)
+
+
+def marking_counts(min_dist, closest, n_target):
+
+    """
+            Parameters
+    ---------------------------
+    :param min_dist: Distance output of nearest_opponent
+    :param closest: Index output of nearest_opponent
+    :param n_target: Number of target players
+
+    :return: Returns the number of frames and the sum of distances for every (source, target) pair,
+             both of shape (source players, target players).
+    """
+    n_source = closest.shape[1]
+    found = closest >= 0
+
+    pair = (np.arange(n_source)[None, :] * n_target + closest)[found]
+
+    counts = np.bincount(pair, minlength=n_source * n_target).reshape(n_source, n_target)
+    dist_sum = np.bincount(pair, weights=min_dist[found], minlength=n_source * n_target).reshape(n_source, n_target)
+
+    return counts, dist_sum
+
+
+def _chunk_marking_counts(chunk):
+
+    source_xy, target_xy, assignment = chunk
+    min_dist, closest = marking_opponent(source_xy, target_xy, assignment)
+
+    return marking_counts(min_dist, closest, target_xy.shape[1])
+
+
+def chunked_marking_counts(source_xy, target_xy, chunk_size=1024, workers=1, assignment='nearest'):
+
+    """
+            Parameters
+    ---------------------------
+    :param source_xy: Array of shape (frames, source players, 2) - players marking
+    :param target_xy: Array of shape (frames, target players, 2) - players being marked
+    :param chunk_size: Number of frames in each chunk
+    :param workers: Number of processes used to compute the chunks. None uses all the cores.
+    :param assignment: ('nearest'/'optimal') - Pairs of each frame, see marking_opponent
+
+    Splits the frames into chunks of chunk_size, computes the pair counts and distance sums of each chunk
+    (in a process pool when workers > 1) and adds them up in the order of the chunks. The chunks don't depend on
+    the number of workers, so the result is exactly the same for any number of workers.
+
+    :return: Returns the number of frames and the sum of distances for every (source, target) pair.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    chunks = [(source_xy[start:start + chunk_size], target_xy[start:start + chunk_size], assignment)
+              for start in range(0, len(source_xy), chunk_size)]
+
+    counts = np.zeros((source_xy.shape[1], target_xy.shape[1]), dtype=np.intp)
+    dist_sum = np.zeros((source_xy.shape[1], target_xy.shape[1]))
+
+    if workers == 1 or len(chunks) < 2:
+        results = map(_chunk_marking_counts, chunks)
+        for chunk_counts, chunk_dist_sum in results:
+            counts += chunk_counts
+            dist_sum += chunk_dist_sum
+        return counts, dist_sum
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_counts, chunk_dist_sum in executor.map(_chunk_marking_counts, chunks):
+            counts += chunk_counts
+            dist_sum += chunk_dist_sum
+
+    return counts, dist_sum
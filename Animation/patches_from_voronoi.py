@@ -1,83 +1,93 @@
-from collections import OrderedDict
+from itertools import chain
 import numpy as np
 
 import sys
 sys.path.append('/Game_Animation/Animation/')
 
-def patches_from_voronoi(vor):
+def voronoi_geometry(vor):
         """
         Parameters
         ---------------------------
         param: vor - Output from the scipy Voronoi
-    
-        return: Returns the x and y values to plot patches and boundary lines
+
+        return: Returns the flat x and y values of the patches with the offsets of each patch (patches + 1),
+                and the flat x and y values of the boundary lines with their offsets
         """
-        x_patch, y_patch = [], []
-        x1_patch, y1_patch = [], []
-        
+
         """
         The Voronoi has 2 parts. The actual patches and the
         lines (that run indefinitely). The below code gets the patches.
-        
-        """ 
-        for region in vor.regions:
-            if not -1 in region:
-                x1_patch, y1_patch = [], []
-                for i in region:
-                    x1_patch.append(vor.vertices[i][0])
-                    y1_patch.append(vor.vertices[i][1])
 
-            x_patch.append(np.array(x1_patch))
-            y_patch.append(np.array(y1_patch))
+        All the region vertex indices are flattened into one array, so the patches are built
+        with array indexing instead of a loop over the vertices.
+
+        """
+        lengths = np.fromiter(map(len, vor.regions), dtype=np.intp, count=len(vor.regions))
+        indices = np.fromiter(chain.from_iterable(vor.regions), dtype=np.intp, count=lengths.sum())
+        region_of = np.repeat(np.arange(len(lengths)), lengths)
 
+        infinite = np.zeros(len(lengths), dtype=bool)
+        infinite[region_of[indices < 0]] = True
+
+        finite = ~infinite & (lengths > 0)
+
+        """
+        Patches are kept in the order of the regions. Regions that run indefinitely are skipped, except
+        when they come before the first finite region - those (and the empty region) give one empty patch.
 
         """
-        The below code gets the line segments that define the 
+        empty = (~infinite & (lengths == 0)) | (infinite & (np.cumsum(finite) == 0))
+        keep = finite.copy()
+        if empty.any():
+            keep[np.argmax(empty)] = True
+
+        counts = np.where(finite, lengths, 0)[keep]
+        vertices = vor.vertices[indices[finite[region_of]]]
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        """
+        The below code gets the line segments that define the
         indefinite boundary. (sourced from voronoi_plot_2d code)
-        
+
         """
-        
         center = vor.points.mean(axis=0)
-        ptp_bound = vor.points.ptp(axis=0)
+        ptp_bound = np.ptp(vor.points, axis=0)
+
+        ridge_vertices = np.asarray(vor.ridge_vertices, dtype=np.intp).reshape(-1, 2)
+        ridge_infinite = (ridge_vertices < 0).any(axis=1)
 
-        line_segments = []
-        for pointidx, simplex in zip(vor.ridge_points, vor.ridge_vertices):
-            simplex = np.asarray(simplex)
-            if np.any(simplex < 0):
-                i = simplex[simplex >= 0][0]  # finite end Voronoi vertex
+        finite_end = ridge_vertices[ridge_infinite].max(axis=1)  # finite end Voronoi vertex
+        ridge_points = vor.points[vor.ridge_points[ridge_infinite]]
 
-                t = vor.points[pointidx[1]] - vor.points[pointidx[0]]  # tangent
-                t /= np.linalg.norm(t)
-                n = np.array([-t[1], t[0]])  # normal
+        t = ridge_points[:, 1] - ridge_points[:, 0]  # tangent
+        t /= np.sqrt(t[:, 0] * t[:, 0] + t[:, 1] * t[:, 1])[:, None]
+        n = np.column_stack((-t[:, 1], t[:, 0]))  # normal
 
-                midpoint = vor.points[pointidx].mean(axis=0)
-                direction = np.sign(np.dot(midpoint - center, n)) * n
-                far_point = vor.vertices[i] + direction * ptp_bound.max()
+        midpoint = ridge_points.mean(axis=1)
+        side = (midpoint[:, 0] - center[0]) * n[:, 0] + (midpoint[:, 1] - center[1]) * n[:, 1]
+        direction = np.sign(side)[:, None] * n
+        far_point = vor.vertices[finite_end] + direction * ptp_bound.max()
 
-                line_segments.append([(vor.vertices[i, 0], vor.vertices[i, 1]),
-                                      (far_point[0], far_point[1])])
+        x_vor_ls = np.column_stack((vor.vertices[finite_end, 0], far_point[:, 0])).ravel()
+        y_vor_ls = np.column_stack((vor.vertices[finite_end, 1], far_point[:, 1])).ravel()
+        ls_offsets = np.arange(0, len(x_vor_ls) + 1, 2)
 
-        x_vor_ls, y_vor_ls = [], []
-        
-        for region in line_segments:
+        return np.ascontiguousarray(vertices[:, 0]), np.ascontiguousarray(vertices[:, 1]), offsets, \
+            x_vor_ls, y_vor_ls, ls_offsets
 
-            x1, y1 = [], []
-            for i in region:
-                x1.append(i[0])
-                y1.append(i[1])
 
-            x_vor_ls.append(np.array(x1))
-            y_vor_ls.append(np.array(y1))
-            
+def patches_from_voronoi(vor):
+        """
+        Parameters
+        ---------------------------
+        param: vor - Output from the scipy Voronoi
 
+        return: Returns the x and y values to plot patches and boundary lines
         """
-        Removing patches and boundary lines that are duplicated
-        
-        """        
-        x_patch = list(OrderedDict((tuple(x), x) for x in x_patch).values())
-        y_patch = list(OrderedDict((tuple(x), x) for x in y_patch).values())
-        x_vor_ls = list(OrderedDict((tuple(x), x) for x in x_vor_ls).values())
-        y_vor_ls = list(OrderedDict((tuple(x), x) for x in y_vor_ls).values())
-    
-        return x_patch, y_patch, x_vor_ls, y_vor_ls
+        x, y, offsets, x_ls, y_ls, ls_offsets = voronoi_geometry(vor)
+
+        if len(offsets) < 2:
+            return [], [], np.split(x_ls, ls_offsets[1:-1]), np.split(y_ls, ls_offsets[1:-1])
 
+        return np.split(x, offsets[1:-1]), np.split(y, offsets[1:-1]), \
+            np.split(x_ls, ls_offsets[1:-1]), np.split(y_ls, ls_offsets[1:-1])
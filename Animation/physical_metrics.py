@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+# importing pandas and numpy
+import numpy as np
+import pandas as pd
+
+from Animation.frame_store import TEAM_DEF, TEAM_ATT
+from Animation.travel_distance import path_steps, path_distance
+
+"""
+Physical metrics of a full match - speed, acceleration, distance and time in speed zones and sprints of every
+player, computed in one pass over the (frames, players, 2) locations of a FrameStore. Speeds are in units of the
+coordinates per unit of the game time, for example metres per second.
+
+"""
+
+# Per frame arrays of shape (frames, players) - distance covered up to the frame, speed, acceleration and time
+# of the step to the frame (since the player was last seen)
+Kinematics = namedtuple('Kinematics', ['distance', 'speed', 'acceleration', 'elapsed'])
+
+# Lower bounds of the walking, jogging, running, high speed running and sprinting zones in metres per second
+SPEED_ZONES = (0, 2, 4, 5.5, 7)
+
+
+def player_kinematics(xy, times, smooth=1):
+
+    """
+            Parameters
+    ---------------------------
+    :param xy: Array of shape (frames, players, 2) with the player locations. NaN when a player is missing.
+    :param times: Sorted frame times
+    :param smooth: Number of frames of the centered moving average applied to the speed before the acceleration
+                   is taken. Default value is 1 (no smoothing).
+
+    The speed at a frame is the step from the last frame the player was seen, over the time between the two
+    frames - a player that comes back after a gap is not shown as running at the speed of the jump.
+    The acceleration is the change of speed between consecutive frames.
+
+    :return: Returns the Kinematics of the match. Distance is the distance covered up to each frame (path_distance),
+             speed, acceleration and elapsed are NaN when the player is missing.
+    """
+    present = ~np.isnan(xy[:, :, 0])
+
+    last_seen, steps = path_steps(xy)
+    distance = path_distance(steps)
+
+    # time since the player was last seen
+    since_seen = np.asarray(times, dtype=np.float64)[1:, None] - np.asarray(times, dtype=np.float64)[last_seen[:-1]]
+
+    speed, elapsed = np.full(present.shape, np.nan), np.full(present.shape, np.nan)
+    moved = present[1:] & present[last_seen[:-1], np.arange(present.shape[1])] & (since_seen > 0)
+    speed[1:][moved] = steps[moved] / since_seen[moved]
+    elapsed[1:][moved] = since_seen[moved]
+
+    if smooth > 1:
+        speed = pd.DataFrame(speed).rolling(smooth, center=True, min_periods=1).mean().values
+        speed[~present] = np.nan
+
+    acceleration = np.full(present.shape, np.nan)
+    acceleration[1:] = np.diff(speed, axis=0) / np.diff(np.asarray(times, dtype=np.float64))[:, None]
+
+    return Kinematics(distance, speed, acceleration, elapsed)
+
+
+def sprint_counts(speed, times, sprint_speed, min_duration):
+
+    """
+    :param speed: Speed output of player_kinematics
+    :param times: Sorted frame times
+    :param sprint_speed: Speed from which a player is sprinting
+    :param min_duration: Sprints shorter than min_duration are not counted
+
+    :return: Returns the number of sprints and the time spent sprinting of every player
+    """
+    above = np.zeros((speed.shape[1], speed.shape[0] + 2), dtype=np.int8)
+    above[:, 1:-1] = (speed >= sprint_speed).T
+
+    # each run of frames above the sprint speed is one start and one end, in order for every player
+    player, start = np.nonzero(np.diff(above, axis=1) == 1)
+    end = np.nonzero(np.diff(above, axis=1) == -1)[1]
+
+    # the speed of a frame is the step from the frame before it
+    duration = times[end - 1] - times[np.maximum(start - 1, 0)]
+    sprint = duration >= min_duration
+
+    counts = np.bincount(player[sprint], minlength=speed.shape[1])
+    sprint_time = np.bincount(player[sprint], weights=duration[sprint], minlength=speed.shape[1])
+
+    return counts, sprint_time
+
+
+def physical_metrics(store, speed_zones=SPEED_ZONES, sprint_speed=7, sprint_duration=1, smooth=1,
+                     start=None, end=None, kinematics=None):
+
+    """
+            Parameters
+    ---------------------------
+    :param store: FrameStore of the match
+    :param speed_zones: Lower bounds of the speed zones, in increasing order. Default values are 0, 2, 4, 5.5 and 7
+                        (metres per second - walking, jogging, running, high speed running and sprinting).
+    :param sprint_speed: Speed from which a player is sprinting. Default value is 7.
+    :param sprint_duration: Minimum time above sprint_speed counted as a sprint. Default value is 1.
+    :param smooth: Frames of the moving average of the speed, see player_kinematics. Default value is 1.
+    :param start: Game time the metrics are computed from. Defaults to the start of the match.
+    :param end: Game time the metrics are computed to. Defaults to the end of the match.
+    :param kinematics: Kinematics of the match from player_kinematics, so they are not computed again
+
+    :return: Returns a dataframe with one row per player - player_id, team_id, time_played, distance,
+             mean_speed, max_speed, max_acceleration, max_deceleration, sprints, sprint_time, and the distance and
+             time in each speed zone (distance_<zone>, time_<zone>, where the zone is its lower bound).
+    """
+    speed_zones = np.asarray(speed_zones, dtype=np.float64)
+
+    if not len(speed_zones) or (np.diff(speed_zones) <= 0).any():
+        raise ValueError("The expected speed zones are increasing lower bounds but {} was provided.".format(list(speed_zones)))
+
+    if kinematics is None:
+        kinematics = player_kinematics(store.xy, store.times, smooth)
+
+    times = np.asarray(store.times, dtype=np.float64)
+    first = 0 if start is None else np.searchsorted(times, start, side='left')
+    last = len(times) if end is None else np.searchsorted(times, end, side='right')
+
+    if last - first < 2:
+        raise ValueError("There are less than two frames between {} and {}.".format(start, end))
+
+    players = np.flatnonzero(np.isin(store.team_codes, [TEAM_DEF, TEAM_ATT]))
+
+    distance = kinematics.distance[first:last, players]
+    speed = kinematics.speed[first:last, players]
+    acceleration = kinematics.acceleration[first:last, players]
+    times = times[first:last]
+
+    # each step (from the frame before) is counted in the zone of the speed it was covered at. The time of a step
+    # is the time since the player was last seen, so the step after a gap is not covered in one frame interval.
+    steps, step_time = np.diff(distance, axis=0), kinematics.elapsed[first + 1:last, players]
+    step_speed = speed[1:]
+    moving = ~np.isnan(step_speed) & ~np.isnan(step_time)
+
+    zone = np.searchsorted(speed_zones, np.where(moving, step_speed, -np.inf), side='right') - 1
+    counted = moving & (zone >= 0)
+    pair = (zone * len(players) + np.arange(len(players)))[counted]
+
+    zone_distance = np.bincount(pair, weights=steps[counted], minlength=len(speed_zones) * len(players))
+    zone_time = np.bincount(pair, weights=step_time[counted], minlength=len(speed_zones) * len(players))
+
+    sprints, sprint_time = sprint_counts(speed, times, sprint_speed, sprint_duration)
+
+    time_played = np.where(moving, step_time, 0).sum(axis=0)
+    team_ids = [store.id_def if team_code == TEAM_DEF else store.id_att for team_code in store.team_codes[players]]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics = pd.DataFrame({'player_id': store.player_ids[players],
+                                'team_id': team_ids,
+                                'time_played': time_played,
+                                'distance': distance[-1] - distance[0],
+                                'mean_speed': np.where(time_played > 0, (distance[-1] - distance[0]) / time_played,
+                                                       np.nan),
+                                'max_speed': np.nanmax(np.where(moving, step_speed, -np.inf), axis=0),
+                                'max_acceleration': np.nanmax(np.nan_to_num(acceleration, nan=-np.inf), axis=0),
+                                'max_deceleration': np.nanmin(np.nan_to_num(acceleration, nan=np.inf), axis=0),
+                                'sprints': sprints,
+                                'sprint_time': sprint_time})
+
+    for i, lower in enumerate(speed_zones):
+        name = '{:g}'.format(lower)
+        metrics['distance_' + name] = zone_distance[i * len(players):(i + 1) * len(players)]
+        metrics['time_' + name] = zone_time[i * len(players):(i + 1) * len(players)]
+
+    # players that never moved in the window have no speed
+    metrics = metrics.replace([np.inf, -np.inf], np.nan)
+
+    return metrics
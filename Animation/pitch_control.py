@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+# importing numpy
+import numpy as np
+
+from Animation.frame_store import TEAM_DEF, TEAM_ATT
+
+"""
+Space ownership of the pitch on a grid - every cell of the grid is owned by the nearest player (or team). All the
+cells, players and frames of a chunk are computed at once with numpy broadcasting, without a voronoi per frame,
+and each frame is one small uint8 raster drawn with a single image glyph.
+
+"""
+
+CONTROL_MODES = ['team', 'player']
+
+# raster value of the cells without any player
+NO_OWNER = 255
+
+
+def pitch_grid(x_range, y_range, resolution=1.):
+
+    """
+    :param x_range: x range of the pitch coordinates
+    :param y_range: y range of the pitch coordinates
+    :param resolution: Size of a cell of the grid, in units of the coordinates
+    :return: Returns the x and y coordinates of the centers of the columns and rows of the grid
+    """
+    if not isinstance(resolution, (int, float)) or resolution <= 0:
+        raise ValueError("The expected resolution is a positive number but {} was provided.".format(resolution))
+
+    def centers(limits):
+        n_cells = max(1, int(np.ceil((max(limits) - min(limits)) / float(resolution))))
+        return (min(limits) + (np.arange(n_cells) + .5) * (max(limits) - min(limits)) / n_cells).astype(np.float32)
+
+    return centers(x_range), centers(y_range)
+
+
+def ownership(xy, team_codes, grid_x, grid_y, mode='team', scale=None, chunk_size=None):
+
+    """
+            Parameters
+    ---------------------------
+    :param xy: Array of shape (frames, players, 2) with the player locations. NaN when a player is missing.
+    :param team_codes: Team code of each player - only the players of the two teams own space, not the ball
+    :param grid_x: x coordinates of the columns of the grid (see pitch_grid)
+    :param grid_y: y coordinates of the rows of the grid
+    :param mode: ('team'/'player') - 'team' gives the team that owns each cell, 'player' the player that owns it
+    :param scale: Distance weighting of team ownership. If None, a cell belongs to the team of its nearest player
+                  (0 defending, 254 attacking). Otherwise the value goes from 0 to 254 with the difference between
+                  the distance of the nearest defender and of the nearest attacker - a cell that both teams reach
+                  at the same distance is 127, and scale is the distance difference that gives about 3/4 control.
+    :param chunk_size: Number of frames computed together. Defaults to the number of frames that keeps the
+                       (frames, rows, columns, players) distances under 64 MB.
+
+    The squared distance of every cell to every player is the sum of an x and a y term that are each computed
+    only on one axis of the grid, and broadcast to the whole grid.
+
+    :return: Returns a uint8 array of shape (frames, rows, columns) - the owning team or the position of the owning
+             player on the players axis. Cells without any player are NO_OWNER.
+    """
+    if mode not in CONTROL_MODES:
+        raise ValueError("Only team/player in accepted as control mode, but {} was provided.".format(mode))
+
+    team_codes = np.asarray(team_codes)
+    players = np.flatnonzero(np.isin(team_codes, [TEAM_DEF, TEAM_ATT]))
+
+    if mode == 'player' and len(players) and players.max() >= NO_OWNER:
+        raise ValueError("Player ownership supports up to {} players.".format(NO_OWNER))
+
+    n_frames = len(xy)
+    raster = np.full((n_frames, len(grid_y), len(grid_x)), NO_OWNER, dtype=np.uint8)
+
+    if chunk_size is None:
+        chunk_size = max(1, (64 * 2 ** 20) // (4 * len(grid_x) * len(grid_y) * max(len(players), 1)))
+
+    att = team_codes[players] == TEAM_ATT
+
+    for start in range(0, n_frames, chunk_size):
+        end = min(start + chunk_size, n_frames)
+
+        chunk_xy = np.asarray(xy[start:end, players], dtype=np.float32)
+
+        dx = grid_x[None, None, :, None] - chunk_xy[:, None, None, :, 0]
+        dy = grid_y[None, :, None, None] - chunk_xy[:, None, None, :, 1]
+        dist = dx ** 2 + dy ** 2
+        dist[np.isnan(dist)] = np.inf
+
+        if mode == 'player':
+            owner = dist.argmin(axis=3)
+            owned = np.isfinite(np.take_along_axis(dist, owner[..., None], axis=3)[..., 0])
+            raster[start:end] = np.where(owned, players[owner], NO_OWNER)
+            continue
+
+        att_dist = np.sqrt(dist[..., att].min(axis=3)) if att.any() else np.full(dist.shape[:3], np.inf)
+        def_dist = np.sqrt(dist[..., ~att].min(axis=3)) if (~att).any() else np.full(dist.shape[:3], np.inf)
+
+        if scale is None:
+            control = (att_dist < def_dist).astype(np.float32)
+        else:
+            with np.errstate(invalid='ignore', over='ignore'):
+                control = 1 / (1 + np.exp(-np.log(3) * (def_dist - att_dist) / scale))
+            control[np.isinf(att_dist) & np.isfinite(def_dist)] = 0
+            control[np.isfinite(att_dist) & np.isinf(def_dist)] = 1
+
+        owned = np.isfinite(att_dist) | np.isfinite(def_dist)
+        raster[start:end] = np.where(owned, np.round(np.nan_to_num(control) * 254), NO_OWNER)
+
+    return raster
+
+
+class ControlCache(object):
+
+    """
+            Parameters
+    ---------------------------
+    :param store: FrameStore of the match
+    :param x_range: x range of the pitch coordinates
+    :param y_range: y range of the pitch coordinates
+    :param resolution: Size of a cell of the grid. Default value is 1.
+    :param mode: ('team'/'player') - See ownership. Default value is 'team'.
+    :param scale: Distance weighting of team ownership, see ownership. Default value is None.
+    :param chunk_size: Number of frames computed together - a frame that is not in the cache is computed with the
+                       frames after it, which are the next frames of the playback. Default value is 64.
+    :param maxsize: Maximum number of frames to keep in the cache. Default value is 5000.
+
+    Bounded cache of the ownership rasters of a match, keyed by frame position.
+
+    """
+
+    def __init__(self, store, x_range, y_range, resolution=1., mode='team', scale=None, chunk_size=64,
+                 maxsize=5000):
+
+        if mode not in CONTROL_MODES:
+            raise ValueError("Only team/player in accepted as control mode, but {} was provided.".format(mode))
+
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("The expected cache size is a positive integer but {} was provided.".format(maxsize))
+
+        self.store = store
+        self.grid_x, self.grid_y = pitch_grid(x_range, y_range, resolution)
+        self.mode = mode
+        self.scale = scale
+        self.chunk_size = min(chunk_size, maxsize)
+        self.maxsize = maxsize
+        self._frames = OrderedDict()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, position):
+        return position in self._frames
+
+    @property
+    def nbytes(self):
+        return sum(raster.nbytes for raster in self._frames.values())
+
+    def get(self, position):
+
+        """
+        :param position: Frame position
+        :return: Returns the (rows, columns) ownership raster of the frame
+        """
+        if position in self._frames:
+            self._frames.move_to_end(position)
+            return self._frames[position]
+
+        positions = np.arange(position, min(position + self.chunk_size, len(self.store)))
+        positions = positions[[p not in self._frames for p in positions]]
+        positions = positions[:np.argmax(np.diff(np.r_[positions, -1]) != 1) + 1]
+
+        rasters = ownership(self.store.xy[positions[0]:positions[-1] + 1], self.store.team_codes,
+                            self.grid_x, self.grid_y, self.mode, self.scale)
+
+        for p, raster in zip(positions, rasters):
+            self._frames[p] = raster
+            self._frames.move_to_end(p)
+
+        while len(self._frames) > self.maxsize:
+            self._frames.popitem(last=False)
+
+        self._frames.move_to_end(position)
+
+        return self._frames[position]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import time as _time
+
+# importing numpy
+import numpy as np
+
+
+class PlaybackClock(object):
+
+    """
+            Parameters
+    ---------------------------
+    :param times: Sorted frame times of the match
+    :param step: Game time between two frames (the slider steps)
+    :param interval: Milliseconds between two frames at normal speed (the animation speed)
+    :param speed: Playback speed multiplier - 0.5 plays at half speed, 2 at twice the speed. Default value is 1.
+    :param drop_frames: (True/False) - Keep the playback in step with the wall clock by skipping the frames the
+                        server doesn't have time to draw. If False, every frame is drawn and a slow frame delays the
+                        playback. Default value is True.
+
+    Tracks the game clock against the wall clock. At normal speed the game moves by step every interval
+    milliseconds. Each tick returns the frame due at that moment, looking ahead by the average time an update
+    takes, so when updates are slower than the interval the frames in between are skipped instead of the
+    callbacks piling up and the playback drifting behind.
+
+    """
+
+    def __init__(self, times, step, interval, speed=1, drop_frames=True):
+
+        if not isinstance(speed, (int, float)) or speed <= 0:
+            raise ValueError("The expected playback speed is a positive number but {} was provided.".format(speed))
+
+        self.times = np.asarray(times)
+        self.step = step
+        self.speed = speed
+        self.drop_frames = drop_frames
+
+        # game time per wall clock second
+        self.rate = speed * step * 1000. / interval
+
+        # ticks faster than the interval are only useful to skip frames, slower speeds tick less often
+        if drop_frames:
+            self.interval = interval / min(speed, 1)
+        else:
+            self.interval = interval / speed
+
+        self.update_time = 0.
+        self._start = None
+        self._wall = None
+        self._last = None
+
+    def start(self, time):
+
+        """
+        :param time: Game time the playback starts from
+        """
+        self._start = time
+        self._wall = _time.perf_counter()
+        self._last = time
+
+    def record(self, seconds):
+
+        """
+        :param seconds: Time taken by the last update - kept as a moving average
+        """
+        self.update_time = seconds if not self.update_time else .8 * self.update_time + .2 * seconds
+
+    def tick(self, current):
+
+        """
+        :param current: Current game time of the slider. If it was moved since the last tick, the clock restarts
+                        from there.
+        :return: Returns the time of the frame to be drawn or None if the current frame is still due
+        """
+        if self._last is None or current != self._last:
+            self.start(current)
+
+        if not self.drop_frames:
+            position = np.searchsorted(self.times, current + self.step * (1 - 1e-6))
+            if position >= len(self.times):
+                position = 0
+            self.start(float(self.times[position]))
+            return self._last
+
+        due = self._start + (_time.perf_counter() - self._wall + self.update_time) * self.rate
+
+        if due > self.times[-1]:
+            self.start(float(self.times[0]))
+            return self._last
+
+        position = max(np.searchsorted(self.times, due, side='right') - 1, 0)
+
+        if self.times[position] == self._last:
+            return None
+
+        self._last = float(self.times[position])
+
+        return self._last
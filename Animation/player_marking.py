@@ -5,6 +5,7 @@
 # ignore warnings
 import warnings
 import sys
+from time import perf_counter
 
 # importing pandas and numpy
 import numpy as np
@@ -13,12 +14,19 @@ import pandas as pd
 # importing bokeh and its related functions
 from bokeh.io import curdoc
 from bokeh.layouts import row, widgetbox,column
-from bokeh.models import ColumnDataSource, LabelSet
+from bokeh.models import ColumnDataSource, LabelSet, CustomJS
 from bokeh.models.widgets import Slider, Button
 from bokeh.plotting import figure
 
-# importing cdist from scipy
-from scipy.spatial.distance import cdist
+from Animation.frame_store import FrameStore, TEAM_DEF, TEAM_ATT
+from Animation.nearest_marker import marking_opponent, ASSIGNMENTS
+from Animation.frame_delta import SourceUpdater
+from Animation.flat_geometry import segments
+from Animation.playback_clock import PlaybackClock
+from Animation.resample import resample
+from Animation.match_cache import MatchCache, SHARED_CACHE, shared_store
+from Animation.stage_timer import StageTimer, profile_stats
+from Animation.client_playback import playback_js, window_frames, window_lines, LINES_JS
 
 warnings.filterwarnings("ignore")
 
@@ -27,13 +35,16 @@ if sys.version_info[0] < 3:
 
 
 def player_marking(doc, df, headers, id_def, id_att, slider_steps, x_range, y_range,
-                   image_url, sport='football', anim_speed=50, attack = True):
+                   image_url, sport='football', anim_speed=50, attack = True,
+                   client_playback=False, client_window=500, playback_speed=1, drop_frames=True,
+                   profile=False, profile_panel=False, profile_log=None, shared_cache=False,
+                   resample_frames=False, assignment='nearest'):
 
     """
                 Parameters
         ---------------------------
         :param doc: Plots the graph
-        :param df: Gets the user defined dataframe
+        :param df: Gets the user defined dataframe, a FrameStore or the path of a converted match
         :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
 
         {x, y - int/float - Player location coordinates x and y
@@ -52,6 +63,24 @@ def player_marking(doc, df, headers, id_def, id_att, slider_steps, x_range, y_ra
                         while sports that have decreasing timer (12 to 0 minutes) should use "basketball".
         :param attack:(True/False) - If 'True', then the attacking team is considered players marking and defending
         team is considered as players being marked. If 'false' then logic is reversed.
+        :param client_playback: (True/False) - Play the animation in the browser. Locations and marking lines of a
+        window of frames are sent once and played by a javascript timer, so the server only works when the slider
+        is moved or the next window is needed. Default value is False.
+        :param client_window: Number of frames sent to the browser at once for client playback. Default value is 500.
+        :param playback_speed: Playback speed multiplier - 0.5 plays at half speed, 2 at twice the speed. Default value is 1.
+        :param drop_frames: (True/False) - Skip frames when the server falls behind so the playback keeps to real time.
+                            If False, every frame is drawn. Default value is True.
+        :param profile: (True/False/StageTimer) - Time each stage of the slider update (frame, marking, send).
+                        Pass a StageTimer to read the stats from outside the app with timer.stats(). Default value is False.
+        :param profile_panel: (True/False) - Show the stage timings (ms) below the plot. Default value is False.
+        :param profile_log: Path of a log file the stage timings are appended to every 10 seconds. Default value is None.
+        :param shared_cache: (True/False/MatchCache) - Share the FrameStore of the match between all the sessions of the
+        bokeh server process that open the same match. Default value is False.
+        :param resample_frames: (True/False) - Resample the match to one frame per slider step, so that the slider
+        step doesn't have to match the spacing of the data. Default value is False.
+        :param assignment: ('nearest'/'optimal') - 'nearest' draws a line from each player to the nearest opponent.
+        'optimal' pairs the players one-to-one with the lowest total distance, so no opponent is marked twice.
+        Default value is 'nearest'.
 
         :return: Returns the animation plot
 
@@ -61,7 +90,7 @@ def player_marking(doc, df, headers, id_def, id_att, slider_steps, x_range, y_ra
         ---------------------------
 
         """
-    if not isinstance(df, pd.DataFrame):
+    if not isinstance(df, (pd.DataFrame, FrameStore, str)):
         raise ValueError("The expected data type of input data is a dataframe but a {} was provided.".format(type(df)))
 
     accept_dtypes_id = [int, float, str, tuple]
@@ -90,90 +119,97 @@ def player_marking(doc, df, headers, id_def, id_att, slider_steps, x_range, y_ra
         raise ValueError(
             "Only football/basketball in accepted as input for sport type, but {} was provided.".format(sport))
 
+    if not isinstance(client_window, int) or client_window < 1:
+        raise ValueError("The expected value for client_window is a positive integer but {} was provided.".format(client_window))
+
+    if not isinstance(profile, (bool, StageTimer)):
+        raise ValueError("The expected value for profile is True/False or a StageTimer but {} was provided.".format(profile))
+
+    if not isinstance(shared_cache, (bool, MatchCache)):
+        raise ValueError("The expected value for shared_cache is True/False or a MatchCache but {} was provided.".format(shared_cache))
+
+    if assignment not in ASSIGNMENTS:
+        raise ValueError("Only nearest/optimal in accepted as assignment, but {} was provided.".format(assignment))
+
     if not isinstance(image_url, list):
         image_url = [image_url]
 
-    all_team = pd.DataFrame(df, columns=headers)
+    """
+       The match is held in one FrameStore - (frames, players, 2) locations and a sorted time axis, so that
+       every frame lookup is a binary search instead of a scan of the match. A FrameStore can also be passed
+       directly, to share one copy of the match between plots, or the path of a match written with
+       convert_match, which is opened as a memory map.
 
-    all_team['x'] = pd.to_numeric(all_team['x'])
-    all_team['y'] = pd.to_numeric(all_team['y'])
-    all_team['time'] = pd.to_numeric(all_team['time'])
-    all_team['player_id'] = all_team['player_id'].apply(str)
+    """
+    cache = None
 
-    all_team['team_id'] = np.where(((all_team['team_id'] != id_att) & (all_team['team_id'] != id_def)), -99,
-                                   all_team['team_id'])
-    all_team['player_id'] = np.where(((all_team['team_id'] != id_att) & (all_team['team_id'] != id_def)), " ",
-                                     all_team['player_id'])
+    if shared_cache is not False:
+        cache = SHARED_CACHE if shared_cache is True else shared_cache
+        match, store = shared_store(df, headers, id_def, id_att, sport, cache)
 
-    if sport == 'basketball':
-        all_team['time'] = - all_team['time']
-        all_team = all_team.sort_values(['time', 'team_id', 'player_id'], ascending=[False, False, True]).reset_index(
-            drop=True)
     else:
-        all_team['time'] = all_team['time']
-        all_team = all_team.sort_values(['time', 'team_id', 'player_id'], ascending=[True, False, True]).reset_index(
-            drop=True)
+        if isinstance(df, str):
+            df = FrameStore.load(df)
 
-    team_def = all_team[all_team.team_id == id_def]
-    team_att = all_team[all_team.team_id == id_att]
+        if isinstance(df, FrameStore):
+            store = df
+        else:
+            store = FrameStore(df, headers, id_def, id_att, sport)
 
-    if team_def.empty:
-        raise ValueError("Defending team ID is not valid. Please enter a valid team ID")
+    # the resampled match is shared with the make_plot sessions of the same match and step
+    if resample_frames:
+        if cache is None:
+            store = resample(store, slider_steps)
+        else:
+            store = cache.get((match, ('resample', slider_steps)), lambda: resample(store, slider_steps))
 
-    elif team_att.empty:
-        raise ValueError("Attacking team ID is not valid. Please enter a valid team ID")
+    def_players = store.team(TEAM_DEF)
+    att_players = store.team(TEAM_ATT)
 
-    current_time = all_team['time'].min()
+    if isinstance(profile, StageTimer):
+        timer = profile
+    else:
+        timer = StageTimer(enabled=profile or profile_panel or profile_log is not None)
+
+    colors = np.array(['dodgerblue', 'orangered', 'gold'])[store.team_codes]
 
-    coord_x = all_team[all_team.time == current_time]['x']
-    coord_y = all_team[all_team.time == current_time]['y']
+    def get_frame(position):
+
+        if client_playback:
+            frame_xy, players = np.asarray(store.xy[position]), np.arange(len(store.player_ids))
+        else:
+            frame_xy, players = store.frame(position)
 
-    team_def_xy = team_def[team_def.time == current_time]
-    team_att_xy = team_att[team_att.time == current_time]
+        return frame_xy[:, 0], frame_xy[:, 1], store.player_ids[players], colors[players]
 
-    player_id = all_team[all_team['time'] == current_time]['player_id']
+    current_position = 0
+
+    coord_x, coord_y, player_id, c = get_frame(current_position)
 
-    c = (['dodgerblue'] * len(team_def['player_id'].unique()) + ['orangered'] * len(team_att['player_id'].unique()) + [
-        'gold'])
     """
-    For each frame, calculate the nearest player for each given player using cdist
+    For each frame, calculate the nearest player (or the optimal one-to-one pair) for each given player
     
     """
-    def get_distances(team_def_xy, team_att_xy, attack):
+    def get_distances(position, attack):
 
         if attack:
-            columns = team_def_xy['player_id'].values.tolist()
-            index = team_att_xy['player_id'].values.tolist()
-            dist_mat = cdist(team_att_xy[['x', 'y']].values, team_def_xy[['x', 'y']].values)
-            source_x,source_y = team_att_xy['x'].values, team_att_xy['y'].values
-            merge_df = team_def_xy[['player_id', 'x', 'y']]
+            source_xy, target_xy = store.xy[position, att_players], store.xy[position, def_players]
         else:
-            columns = team_att_xy['player_id'].values.tolist()
-            index = team_def_xy['player_id'].values.tolist()
-            dist_mat = cdist(team_def_xy[['x', 'y']].values, team_att_xy[['x', 'y']].values)
-            source_x, source_y = team_def_xy['x'].values, team_def_xy['y'].values
-            merge_df = team_att_xy[['player_id', 'x', 'y']]
-
-        dist_df = pd.DataFrame(dist_mat)
-        dist_df.columns = columns
-        dist_df.index = index
-        nearest_player = dist_df.idxmin(axis=1)
-        dist_df['closest_player'] = nearest_player
-        dist_df['source_player'] = index
-        dist_df['source_x'] = source_x
-        dist_df['source_y'] = source_y
-
-        lines_x = pd.merge(dist_df, merge_df, left_on='closest_player',right_on='player_id', sort=False)\
-            .rename(columns = {'x':'target_x','y':'target_y'})
-        x_lines = list(zip(lines_x['source_x'], lines_x['target_x']))
-        y_lines = list(zip(lines_x['source_y'], lines_x['target_y']))
+            source_xy, target_xy = store.xy[position, def_players], store.xy[position, att_players]
+
+        _, closest = marking_opponent(source_xy[None], target_xy[None], assignment)
+        closest = closest[0]
+        found = closest >= 0
+
+        x_lines = segments(source_xy[found, 0], target_xy[closest[found], 0])
+        y_lines = segments(source_xy[found, 1], target_xy[closest[found], 1])
 
         return x_lines, y_lines
 
-    x_lines, y_lines = get_distances(team_def_xy,team_att_xy,attack)
+    x_lines, y_lines = get_distances(current_position, attack)
 
     source_coord = ColumnDataSource(data=dict(x=coord_x, y=coord_y, player_id=player_id, color=c))
-    source_lines = ColumnDataSource(data=dict(xs=x_lines, ys=y_lines))
+    source_lines = ColumnDataSource(data=dict(x=x_lines, y=y_lines))
 
     """
     Remove plot background and alter other styles
@@ -203,8 +239,8 @@ def player_marking(doc, df, headers, id_def, id_att, slider_steps, x_range, y_ra
 
     plot.image_url(url=image_url, x=image_min_x, y=image_min_y, w=image_max_x, h=image_max_y, anchor="bottom_left")
 
-    plot.multi_line('xs', 'ys', source=source_lines, color='orangered',
-                    line_width=3, line_alpha=.7, line_cap='round', line_dash="dashed")
+    plot.line('x', 'y', source=source_lines, color='orangered',
+              line_width=3, line_alpha=.7, line_cap='round', line_dash="dashed")
     plot.scatter('x', 'y', source=source_coord, size=20, fill_color='color')
 
     labels = LabelSet(x='x', y='y', text='player_id',
@@ -216,63 +252,115 @@ def player_marking(doc, df, headers, id_def, id_att, slider_steps, x_range, y_ra
     plot.axis.visible = False
     plot = plot_clean(plot)
 
-    slider_start = all_team.time.unique().min()
-    slider_end = all_team.time.unique().max()
+    slider_start = store.times[0]
+    slider_end = store.times[-1]
     game_time = Slider(title="Game Time (seconds)", value=slider_start,
                        start=slider_start, end=slider_end, step=slider_steps)
 
     """
-       Update the figure every time slider is updated.
+       Update the figure every time slider is updated. Only the columns that changed are sent to the browser.
+       With client playback the browser changes the sources too, so the data is always replaced.
     """
+    update_coord = SourceUpdater(source_coord, delta=not client_playback)
+    update_lines = SourceUpdater(source_lines, delta=not client_playback)
 
     def update_data(attrname, old, new):
 
-        slider_value = np.round(game_time.value, 2)
+        # the slider snaps to the nearest frame, so any frame spacing works
+        position = store.nearest(game_time.value)
 
-        coord_x = all_team[all_team.time == slider_value]['x']
-        coord_y = all_team[all_team.time == slider_value]['y']
+        with timer.stage('total'):
 
-        team_def_xy = team_def[team_def.time == slider_value]
-        team_att_xy = team_att[team_att.time == slider_value]
+            with timer.stage('frame'):
+                coord_x, coord_y, player_id, c = get_frame(position)
 
-        x_lines, y_lines = get_distances(team_def_xy, team_att_xy, attack)
+            with timer.stage('marking'):
+                x_lines, y_lines = get_distances(position, attack)
 
-        source_coord.data = dict(x=coord_x, y=coord_y, player_id=player_id, color=c)
-        source_lines.data = dict(xs=x_lines, ys=y_lines)
+            # the document changes are serialized when the sources are updated
+            with timer.stage('send'):
+                update_coord.update(x=coord_x, y=coord_y, player_id=player_id, color=c)
+                update_lines.update(x=x_lines, y=y_lines)
 
+            if client_playback and not window[0] <= position < window[1]:
+                with timer.stage('client_window'):
+                    load_window(position)
 
     for w in [game_time]:
         w.on_change('value', update_data)
 
+    """
+       Client side playback - send a window of frames to the browser
+    """
+    source_frames = ColumnDataSource(data=dict(time=[], players=[], line_values=[]))
+    source_frame_xy = ColumnDataSource(data=dict(x=[], y=[]))
+    source_line_xy = ColumnDataSource(data=dict(x=[], y=[]))
+    window = [0, 0]
+
+    def load_window(position):
+
+        positions, x, y = window_frames(store, position, client_window)
+
+        if attack:
+            line_x, line_y = window_lines(store, positions, att_players, def_players, assignment)
+        else:
+            line_x, line_y = window_lines(store, positions, def_players, att_players, assignment)
+
+        source_frame_xy.data = dict(x=x, y=y)
+        source_line_xy.data = dict(x=line_x, y=line_y)
+        source_frames.data = dict(time=store.times[positions], players=np.full(len(positions), len(store.player_ids)),
+                                  line_values=np.full(len(positions), len(line_x) // len(positions)))
+
+        window[:] = [positions[0], positions[-1] + 1]
+
+    if client_playback:
+        load_window(current_position)
+
     """
        Animation
     """
 
     def animate_update():
 
-        time = game_time.value + slider_steps
-        if time > all_team.time.max():
-            time = all_team.time.min()
+        time = clock.tick(game_time.value)
+        if time is None:
+            return
+
+        update_start = perf_counter()
         game_time.value = time
+        clock.record(perf_counter() - update_start)
 
+    clock = PlaybackClock(store.times, slider_steps, anim_speed, speed=playback_speed, drop_frames=drop_frames)
     callback_id = None
 
     def animate():
         global callback_id
         if button.label == '► Play':
             button.label = '❚❚ Pause'
-            callback_id = curdoc().add_periodic_callback(animate_update, anim_speed)
+            clock.start(game_time.value)
+            callback_id = curdoc().add_periodic_callback(animate_update, clock.interval)
         else:
             button.label = '► Play'
             curdoc().remove_periodic_callback(callback_id)
 
     button = Button(label='► Play', width=60)
-    button.on_click(animate)
+
+    if client_playback:
+        button.callback = CustomJS(args=dict(button=button, slider=game_time, frames=source_frames,
+                                             frame_xy=source_frame_xy, line_xy=source_line_xy,
+                                             source_coord=source_coord, source_lines=source_lines,
+                                             step=slider_steps, interval=anim_speed, speed=playback_speed),
+                                   code=playback_js(LINES_JS))
+    else:
+        button.on_click(animate)
 
     inputs = widgetbox(row(column(game_time, button)))
 
     layout = column(row(column(plot, inputs)))
 
+    if profile_panel or profile_log is not None:
+        layout = column(layout, profile_stats(doc, timer, profile_panel, profile_log))
+
     doc.add_root(layout)
     doc.title = "Game Animation"
 
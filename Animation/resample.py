@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from numbers import Real
+
+# importing numpy
+import numpy as np
+
+from Animation.frame_store import FrameStore
+
+
+def resample_times(times, step):
+
+    """
+    :param times: Sorted frame times
+    :param step: Time between two frames of the output
+    :return: Returns the uniform time axis from the first to the last frame with the given step
+    """
+    n_frames = int(np.floor((times[-1] - times[0]) / step * (1 + 1e-9))) + 1
+
+    # rounded to the precision of the step, so the times match the values of a slider with the same step
+    decimals = max(0, int(np.ceil(-np.log10(step))) + 3)
+
+    return np.round(times[0] + step * np.arange(n_frames), decimals)
+
+
+def resample(store, step, method='auto', max_gap=None):
+
+    """
+            Parameters
+    ---------------------------
+    :param store: FrameStore of the match
+    :param step: Time between two frames of the output - for example 0.04 for 25 frames per second when the time
+                 is in seconds
+    :param method: ('auto'/'linear'/'nearest') - 'linear' interpolates the location of each player between the
+                   two frames around each output time (upsampling), 'nearest' takes the closest frame (decimation).
+                   'auto' interpolates when the output has more frames than the input and decimates otherwise.
+    :param max_gap: Players are not interpolated across gaps between frames longer than max_gap - they are missing
+                    (NaN) in the output instead. With 'nearest' the frames inside such a gap are missing too, rather
+                    than taken from a frame up to half the gap away. Default value is None (no limit).
+
+    All players are resampled at once on the (frames, players, 2) array - each output frame is a weighted sum
+    of the two input frames around it, found with a binary search over the time axis.
+
+    :return: Returns a new FrameStore with a uniform time axis
+    """
+    if method not in ['auto', 'linear', 'nearest']:
+        raise ValueError("Only auto/linear/nearest in accepted as resampling method, but {} was provided.".format(method))
+
+    if not isinstance(step, Real) or step <= 0:
+        raise ValueError("The expected step is a positive number but {} was provided.".format(step))
+
+    times = store.times
+    new_times = resample_times(times, step)
+
+    if method == 'auto':
+        method = 'linear' if len(new_times) > len(times) else 'nearest'
+
+    if len(times) == 1:
+        return FrameStore.from_arrays(times[:1], np.array(store.xy[:1]), store.player_ids, store.team_codes,
+                                      store.id_def, store.id_att, store.sport)
+
+    # frame before each output time and the weight of the frame after it
+    before = np.clip(np.searchsorted(times, new_times, side='right') - 1, 0, len(times) - 2)
+    gap = times[before + 1] - times[before]
+    weight = np.clip((new_times - times[before]) / gap, 0, 1)
+
+    # output frames that fall between two input frames further apart than max_gap
+    too_far = (weight > 0) & (weight < 1) & (gap > (np.inf if max_gap is None else max_gap))
+
+    if method == 'nearest':
+        frames = before + (weight > .5)
+        xy = np.asarray(store.xy[frames])
+        xy[too_far] = np.nan
+        return FrameStore.from_arrays(new_times, xy, store.player_ids, store.team_codes,
+                                      store.id_def, store.id_att, store.sport)
+
+    xy_before, xy_after = np.asarray(store.xy[before]), np.asarray(store.xy[before + 1])
+    weight = weight.astype(np.float32)[:, None, None]
+
+    xy = xy_before * (1 - weight) + xy_after * weight
+
+    # on a frame of the input the location is kept even if the player is missing from the next frame
+    xy = np.where(weight == 0, xy_before, np.where(weight == 1, xy_after, xy))
+
+    xy[too_far] = np.nan
+
+    return FrameStore.from_arrays(new_times, xy.astype(np.float32), store.player_ids, store.team_codes,
+                                  store.id_def, store.id_att, store.sport)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from time import perf_counter, strftime
+
+# importing pandas and numpy
+import numpy as np
+import pandas as pd
+
+
+class StageTimer(object):
+
+    """
+            Parameters
+    ---------------------------
+    :param size: Number of durations kept for each stage. Older durations are dropped first. Default value is 1000.
+    :param enabled: (True/False) - If False, stages are not timed and cost nothing. Default value is True.
+
+    Records how long each stage of an update takes (in a ring buffer per stage) and reports the percentiles,
+    so a slow animation can be traced back to the stage that is slow.
+
+    Usage:
+
+        timer = StageTimer()
+        with timer.stage('voronoi'):
+            ...
+        timer.stats()
+
+    """
+
+    def __init__(self, size=1000, enabled=True):
+
+        if not isinstance(size, int) or size < 1:
+            raise ValueError("The expected buffer size is a positive integer but {} was provided.".format(size))
+
+        self.size = size
+        self.enabled = enabled
+        self._durations = OrderedDict()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def record(self, name, seconds):
+
+        """
+        :param name: Name of the stage
+        :param seconds: Duration of the stage in seconds
+        """
+        if name not in self._durations:
+            self._durations[name] = deque(maxlen=self.size)
+
+        self._durations[name].append(seconds)
+        self._count += 1
+
+    @contextmanager
+    def stage(self, name):
+
+        """
+        :param name: Name of the stage - times the code run inside the with block
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def stats(self):
+
+        """
+        :return: Returns a dataframe with one row per stage (in the order the stages were first recorded) and the
+                 count, mean, p50, p95, p99 and max durations of the stage in milliseconds
+        """
+        columns = ['count', 'mean', 'p50', 'p95', 'p99', 'max']
+        rows = []
+
+        for durations in self._durations.values():
+            ms = np.asarray(durations) * 1000.
+            rows.append([len(ms), ms.mean()] + list(np.percentile(ms, [50, 95, 99])) + [ms.max()])
+
+        stats = pd.DataFrame(rows, index=list(self._durations), columns=columns)
+        stats.index.name = 'stage'
+
+        return stats
+
+    def reset(self):
+
+        self._durations.clear()
+        self._count = 0
+
+    def dump(self, path):
+
+        """
+        :param path: Log file the stats are appended to, with a timestamp
+        """
+        with open(path, 'a') as f:
+            f.write("{}\n{}\n\n".format(strftime('%Y-%m-%d %H:%M:%S'), self.stats().round(3).to_string()))
+
+
+def profile_stats(doc, timer, panel=True, log=None):
+
+    """
+            Parameters
+    ---------------------------
+    :param doc: Document of the app
+    :param timer: StageTimer of the app
+    :param panel: (True/False) - Show the stage timings in a text panel, refreshed every second
+    :param log: Path of a log file the stage timings are appended to every 10 seconds
+
+    :return: Returns the panel (hidden when panel is False). Nothing is refreshed while no new updates are timed.
+    """
+    # bokeh is only needed for the apps, the timer itself can be used without it
+    from bokeh.models.widgets import PreText
+
+    text = PreText(text="", width=500, visible=panel)
+    counts = dict(panel=0, log=0)
+
+    def has_new(name):
+
+        if len(timer) == counts[name]:
+            return False
+        counts[name] = len(timer)
+        return True
+
+    def refresh_panel():
+        if has_new('panel'):
+            text.text = "Update stage timings (ms)\n\n" + timer.stats().round(2).to_string()
+
+    def refresh_log():
+        if has_new('log'):
+            timer.dump(log)
+
+    if panel:
+        doc.add_periodic_callback(refresh_panel, 1000)
+    if log is not None:
+        doc.add_periodic_callback(refresh_log, 10000)
+
+    return text
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+# importing numpy
+import numpy as np
+
+
+def path_steps(xy):
+
+    """
+    :param xy: Array of shape (frames, players, 2) with the player locations. NaN when a player is missing.
+    :return: Returns the frame each player was last seen at (frames, players), and the step of each player from
+             the frame before (frames - 1, players). When a player is missing, the path continues from the last
+             known location, so a missing frame is a step of 0.
+    """
+    present = ~np.isnan(xy[:, :, 0])
+
+    last_seen = np.where(present, np.arange(len(xy))[:, None], 0)
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+
+    filled = np.take_along_axis(xy, last_seen[:, :, None], axis=0).astype(np.float64)
+
+    steps = np.hypot(*np.diff(filled, axis=0).transpose(2, 0, 1))
+    steps[np.isnan(steps)] = 0
+
+    return last_seen, steps
+
+
+def path_distance(steps):
+
+    """
+    :param steps: Steps output of path_steps
+
+    Integrates the path of every player once, so that the distance covered between any two frames is a
+    difference of two rows of the returned array instead of a groupby over all the frames played so far.
+
+    :return: Returns an array of shape (frames, players) with the distance each player has covered up to each
+             frame - 0 at the first frame
+    """
+    dist = np.zeros((len(steps) + 1,) + steps.shape[1:])
+    np.cumsum(steps, axis=0, out=dist[1:])
+
+    return dist
+
+
+def distance_covered(cum_dist, frame_times, start, end):
+
+    """
+            Parameters
+    ---------------------------
+    :param cum_dist: Output array from path_distance (the distance of player_kinematics)
+    :param frame_times: Sorted unique frame times of the match
+    :param start: Start time of the window
+    :param end: End time of the window
+
+    :return: Returns the distance covered by each player between start and end. O(players) per call.
+    """
+    first = np.searchsorted(frame_times, start, side='left')
+    last = np.searchsorted(frame_times, end, side='right') - 1
+
+    if last < first:
+        return np.zeros(cum_dist.shape[1])
+
+    return cum_dist[last] - cum_dist[first]
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import os
+
+# importing voronoi from scipy
+from scipy.spatial import Voronoi
+
+from Animation.patches_from_voronoi import voronoi_geometry
+from Animation.flat_geometry import nan_separated
+
+
+def voronoi_frame(points):
+
+    """
+    :param points: Array of shape (players, 2) with the player locations of one frame
+    :return: Returns the x and y values to plot voronoi patches and boundary lines for the frame, as single
+             float arrays with the patches (and lines) separated by NaN
+    """
+    x, y, offsets, x_ls, y_ls, ls_offsets = voronoi_geometry(Voronoi(points))
+
+    return nan_separated(x, offsets), nan_separated(y, offsets), \
+        nan_separated(x_ls, ls_offsets), nan_separated(y_ls, ls_offsets)
+
+
+class VoronoiCache(object):
+
+    """
+            Parameters
+    ---------------------------
+    :param maxsize: Maximum number of frames to keep in the cache. Least recently used frames are removed first.
+
+    Bounded cache of voronoi patches and boundary lines keyed by frame time. Frames can be computed in
+    parallel ahead of time with precompute, so that playback and scrubbing only read from the cache.
+
+    """
+
+    def __init__(self, maxsize=5000):
+
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("The expected cache size is a positive integer but {} was provided.".format(maxsize))
+
+        self.maxsize = maxsize
+        self._frames = OrderedDict()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, time):
+        return time in self._frames
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for patches in self._frames.values() for values in patches)
+
+    def _put(self, time, patches):
+
+        self._frames[time] = patches
+        self._frames.move_to_end(time)
+
+        while len(self._frames) > self.maxsize:
+            self._frames.popitem(last=False)
+
+    def get(self, time, points):
+
+        """
+        :param time: Frame time
+        :param points: Player locations of the frame - used only if the frame is not in the cache
+        :return: Returns the x and y values to plot voronoi patches and boundary lines for the frame
+        """
+        if time in self._frames:
+            self._frames.move_to_end(time)
+            return self._frames[time]
+
+        patches = voronoi_frame(points)
+        self._put(time, patches)
+
+        return patches
+
+    def precompute(self, times, points, workers=None):
+
+        """
+        :param times: Frame times to be computed
+        :param points: Arrays with the player locations for each frame time - a list or a generator
+        :param workers: Number of processes to use. Defaults to the number of cores.
+                        Use 1 to compute the frames in the current process.
+
+        Only the first maxsize frames are computed, as the rest would be removed from the cache anyway. The points
+        of a generator are only built for these frames.
+        """
+        times, points = list(islice(times, self.maxsize)), list(islice(points, self.maxsize))
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if workers == 1 or len(times) < 2:
+            results = map(voronoi_frame, points)
+            for time, patches in zip(times, results):
+                self._put(time, patches)
+            return self
+
+        chunksize = max(1, len(times) // (workers * 4))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for time, patches in zip(times, executor.map(voronoi_frame, points, chunksize=chunksize)):
+                self._put(time, patches)
+
+        return self
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+import os
+
+# importing pandas and numpy
+import numpy as np
+import pandas as pd
+
+# importing voronoi from scipy
+from scipy.spatial import Voronoi, QhullError
+
+from Animation.frame_store import FrameStore, TEAM_DEF, TEAM_ATT
+
+"""
+Area of the voronoi cell of every player in every frame, clipped to the pitch. The players are mirrored across
+the four edges of the pitch, so the cells of the players are closed by the edges - no region runs indefinitely
+and no cell has to be clipped polygon by polygon. The areas of all the cells of a chunk of frames are then one
+shoelace sum over the flat vertex arrays.
+
+"""
+
+
+def mirrored_points(points, x_range, y_range):
+
+    """
+    :param points: Array of shape (players, 2) - locations of the players on the pitch
+    :return: Returns the points followed by their reflections across the left, right, bottom and top edges
+    """
+    (x_min, x_max), (y_min, y_max) = sorted(x_range), sorted(y_range)
+    x, y = points[:, 0], points[:, 1]
+
+    return np.concatenate((points,
+                           np.column_stack((2 * x_min - x, y)), np.column_stack((2 * x_max - x, y)),
+                           np.column_stack((x, 2 * y_min - y)), np.column_stack((x, 2 * y_max - y))))
+
+
+def shoelace_areas(x, y, offsets):
+
+    """
+    :param x: Flat x values of the polygons
+    :param y: Flat y values of the polygons
+    :param offsets: Start of each polygon in x and y, followed by the total length (polygons + 1)
+    :return: Returns the area of each polygon. Polygons without vertices have an area of 0.
+    """
+    following = np.arange(1, len(x) + 1) % max(len(x), 1)
+
+    # the last vertex of each polygon closes it with the first one
+    closed = np.diff(offsets) > 0
+    following[offsets[1:][closed] - 1] = offsets[:-1][closed]
+
+    cross = np.concatenate(([0], np.cumsum(x * y[following] - x[following] * y)))
+
+    return np.abs(cross[offsets[1:]] - cross[offsets[:-1]]) / 2
+
+
+def cell_areas(xy, x_range, y_range):
+
+    """
+            Parameters
+    ---------------------------
+    :param xy: Array of shape (frames, players, 2) with the player locations. NaN when a player is missing.
+    :param x_range: x range of the pitch coordinates
+    :param y_range: y range of the pitch coordinates
+
+    Players outside the pitch are moved to its edge. A frame whose voronoi can't be computed (for example two
+    players on the same spot) has no areas.
+
+    :return: Returns an array of shape (frames, players) with the area of the cell of each player inside the pitch.
+             NaN when the player is missing.
+    """
+    (x_min, x_max), (y_min, y_max) = sorted(x_range), sorted(y_range)
+
+    # a player exactly on an edge would meet its own reflection
+    eps_x, eps_y = (x_max - x_min) * 1e-6, (y_max - y_min) * 1e-6
+
+    areas = np.full(xy.shape[:2], np.nan)
+    xs, ys, counts, cells = [], [], [], []
+
+    for frame, frame_xy in enumerate(np.asarray(xy, dtype=np.float64)):
+        present = np.flatnonzero(~np.isnan(frame_xy[:, 0]))
+        if not len(present):
+            continue
+
+        points = np.column_stack((np.clip(frame_xy[present, 0], x_min + eps_x, x_max - eps_x),
+                                  np.clip(frame_xy[present, 1], y_min + eps_y, y_max - eps_y)))
+        try:
+            vor = Voronoi(mirrored_points(points, x_range, y_range))
+        except (QhullError, ValueError):
+            continue
+
+        # players on the same spot share one region
+        point_region = vor.point_region[:len(present)]
+        if len(np.unique(point_region)) < len(present):
+            continue
+
+        regions = [vor.regions[region] for region in point_region]
+        if any(-1 in region for region in regions):
+            continue
+
+        indices = np.fromiter(chain.from_iterable(regions), dtype=np.intp)
+        xs.append(vor.vertices[indices, 0])
+        ys.append(vor.vertices[indices, 1])
+        counts.append([len(region) for region in regions])
+        cells.append(frame * xy.shape[1] + present)
+
+    if not cells:
+        return areas
+
+    counts = np.concatenate(counts)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    cell_area = shoelace_areas(np.concatenate(xs), np.concatenate(ys), offsets)
+    areas.ravel()[np.concatenate(cells)] = np.where(counts > 0, cell_area, np.nan)
+
+    return areas
+
+
+def _chunk_cell_areas(chunk):
+
+    return cell_areas(*chunk)
+
+
+def store_cell_areas(store, x_range, y_range, chunk_size=1000, workers=1):
+
+    """
+            Parameters
+    ---------------------------
+    :param store: FrameStore of the match
+    :param x_range: x range of the pitch coordinates
+    :param y_range: y range of the pitch coordinates
+    :param chunk_size: Number of frames in each chunk
+    :param workers: Number of processes used to compute the chunks. None uses all the cores.
+
+    Only the players of the two teams have a cell, not the ball. The chunks of frames are computed in a process
+    pool when workers > 1.
+
+    :return: Returns the positions of the players on the players axis and the (frames, players) areas of their cells
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    players = np.flatnonzero(np.isin(store.team_codes, [TEAM_DEF, TEAM_ATT]))
+
+    chunks = [(np.asarray(store.xy[start:start + chunk_size, players]), x_range, y_range)
+              for start in range(0, len(store), chunk_size)]
+
+    if workers == 1 or len(chunks) < 2:
+        return players, np.concatenate(list(map(_chunk_cell_areas, chunks)))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return players, np.concatenate(list(executor.map(_chunk_cell_areas, chunks)))
+
+
+def voronoi_stats(df, headers, id_def, id_att, x_range, y_range, sport='football', workers=1):
+
+    """
+                Parameters
+        ---------------------------
+        :param df: Gets the user defined dataframe, a FrameStore or the path of a converted match
+        :param headers: Give the headers to the dataframe - Headers should be ["x", "y", "team_id", "player_id","time"]
+        :param id_def: Provide id of defending team
+        :param id_att: Provide id of attacking team
+        :param x_range: Provide x range of the pitch coordinates
+        :param y_range: Provide y range of the pitch coordinates
+        :param sport: (football/basketball)
+        :param workers: (int) - Number of processes used to compute the areas. The frames are split into chunks
+        that are computed in parallel. Default value is 1 (no parallel processing), None uses all the cores.
+
+        :return: Returns a dataframe with one row per frame (indexed by game time) and one column per player
+        (team_id, player_id) with the area of the voronoi cell of the player inside the pitch.
+
+    """
+    """
+            Value Errors
+    ---------------------------
+
+     """
+    if not isinstance(df, (pd.DataFrame, FrameStore, str)):
+        raise ValueError("The expected data type of input data is a dataframe but a {} was provided.".format(type(df)))
+
+    accept_dtypes_id = [int, float, str, tuple]
+
+    if type(id_def) not in accept_dtypes_id:
+        raise ValueError("The expected data type for defending team-id is either integer, float "
+                         "or a string but {} was provided.".format(type(id_def)))
+
+    if type(id_att) not in accept_dtypes_id:
+        raise ValueError("The expected data type for defending team-id is either integer, float "
+                         "or a string but {} was provided.".format(type(id_att)))
+
+    if not isinstance(x_range, (list, tuple)):
+        raise ValueError("The expected data type for x-range is a list but a {} was provided.".format(type(x_range)))
+
+    if not isinstance(y_range, (list, tuple)):
+        raise ValueError("The expected data type for y-range is a list but a {} was provided.".format(type(y_range)))
+
+    if len(x_range) != 2:
+        raise ValueError("Length of x range of coordinates is {} but expected length is 2.".format(len(x_range)))
+
+    if len(y_range) != 2:
+        raise ValueError("Length of y range of coordinates is {} but expected length is 2.".format(len(y_range)))
+
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        raise ValueError("The expected value for workers is a positive integer or None but {} was provided.".format(workers))
+
+    if isinstance(df, str):
+        store = FrameStore.load(df)
+    elif isinstance(df, FrameStore):
+        store = df
+    else:
+        store = FrameStore(df, headers, id_def, id_att, sport)
+
+    players, areas = store_cell_areas(store, x_range, y_range, workers=workers)
+
+    team_ids = [store.id_def if team_code == TEAM_DEF else store.id_att for team_code in store.team_codes[players]]
+    columns = pd.MultiIndex.from_arrays([team_ids, store.player_ids[players]], names=['team_id', 'player_id'])
+
+    # basketball times are stored negative, so the slider runs from min to max
+    times = -store.times if store.sport == 'basketball' else store.times
+
+    return pd.DataFrame(areas, index=pd.Index(times, name='time'), columns=columns)
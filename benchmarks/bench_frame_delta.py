@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bytes sent to the browser per frame by the make_plot and player_marking updates - full replacement of the
+data of every source against the delta updates of SourceUpdater, on the sample datasets.
+
+Sizes are measured on the real bokeh PATCH-DOC messages (header, metadata, json content and binary buffers)
+created for every document change of a frame, one message per change as the bokeh server sends them.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_frame_delta.py
+
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import ConvexHull
+
+from bokeh.document import Document
+from bokeh.models import ColumnDataSource
+from bokeh.protocol import Protocol
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Animation.frame_store import FrameStore, TEAM_DEF, TEAM_ATT
+from Animation.frame_delta import SourceUpdater
+from Animation.flat_geometry import segments
+from Animation.nearest_marker import nearest_opponent
+from Animation.voronoi_cache import voronoi_frame
+
+HEADERS = ["x", "y", "team_id", "player_id", "time"]
+
+SAMPLES = [('soccer_sample.csv', 2, 1, 'football'),
+           ('sample_basketball.csv', 65, 37, 'basketball'),
+           ('nfl_sample_data.csv', 'away', 'home', 'football')]
+
+PROTOCOL = Protocol("1.0")
+
+
+def message_size(events):
+
+    """
+    :param events: Document change events
+    :return: Returns the bytes of the PATCH-DOC messages of the events - json parts and binary buffers
+    """
+    size = 0
+
+    for event in events:
+        message = PROTOCOL.create('PATCH-DOC', [event])
+        size += len(message.header_json) + len(message.metadata_json) + len(message.content_json)
+        size += sum(len(json.dumps(header)) + len(payload) for header, payload in message.buffers)
+
+    return size
+
+
+class DocumentRecorder(object):
+
+    """
+    Document holding one source per name, that records the change events of the document
+    """
+
+    def __init__(self, data):
+
+        self.doc = Document()
+        self.sources = {name: ColumnDataSource(data=columns) for name, columns in data.items()}
+        for source in self.sources.values():
+            self.doc.add_root(source)
+
+        self.events = []
+        self.doc.on_change(self.events.append)
+
+    def sent(self):
+
+        size = message_size(self.events)
+        del self.events[:]
+
+        return size
+
+
+def frame_sources(store, position):
+
+    colors = np.array(['dodgerblue', 'orangered', 'gold'])[store.team_codes]
+    frame_xy, players = store.frame(position)
+
+    x_patch, y_patch, x_vor_ls, y_vor_ls = voronoi_frame(frame_xy)
+
+    att_xy, def_xy = store.frame(position, TEAM_ATT)[0], store.frame(position, TEAM_DEF)[0]
+    att_hull, def_hull = ConvexHull(att_xy).vertices, ConvexHull(def_xy).vertices
+
+    _, closest = nearest_opponent(att_xy[None], def_xy[None])
+
+    return dict(coord=dict(x=frame_xy[:, 0], y=frame_xy[:, 1], player_id=store.player_ids[players],
+                           color=colors[players]),
+                vor=dict(x=x_patch, y=y_patch),
+                vor_ls=dict(x=x_vor_ls, y=y_vor_ls),
+                ch_att=dict(xc=att_xy[att_hull, 0], yc=att_xy[att_hull, 1]),
+                ch_def=dict(ax=def_xy[def_hull, 0], ay=def_xy[def_hull, 1]),
+                lines=dict(x=segments(att_xy[:, 0], def_xy[closest[0], 0]),
+                           y=segments(att_xy[:, 1], def_xy[closest[0], 1])))
+
+
+def main():
+
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample_data')
+
+    for name, id_def, id_att, sport in SAMPLES:
+        store = FrameStore(pd.read_csv(os.path.join(root, name)), HEADERS, id_def, id_att, sport)
+
+        first = frame_sources(store, 0)
+        full_doc, delta_doc = DocumentRecorder(first), DocumentRecorder(first)
+        updaters = {name: SourceUpdater(source) for name, source in delta_doc.sources.items()}
+
+        full, delta = 0, 0
+
+        for position in range(1, len(store)):
+            frame = frame_sources(store, position)
+
+            for source, data in frame.items():
+                full_doc.sources[source].data = data
+                updaters[source].update(**data)
+
+            full += full_doc.sent()
+            delta += delta_doc.sent()
+
+        frames = len(store) - 1
+        print("{:<24} {:>4} frames   full {:8.0f} bytes/frame   delta {:8.0f} bytes/frame   saved {:5.1f}%".format(
+            name, frames, full / frames, delta / frames, 100 * (1 - delta / float(full))))
+
+
+if __name__ == '__main__':
+    main()
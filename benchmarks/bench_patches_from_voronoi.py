@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark of patches_from_voronoi against the loop based version it replaced.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_patches_from_voronoi.py
+
+"""
+
+from collections import OrderedDict
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import Voronoi
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Animation.patches_from_voronoi import patches_from_voronoi
+
+
+def patches_from_voronoi_loop(vor):
+
+    """
+    Loop based version of patches_from_voronoi (kept only as the reference for this benchmark)
+    """
+    x_patch, y_patch = [], []
+    x1_patch, y1_patch = [], []
+
+    for region in vor.regions:
+        if not -1 in region:
+            x1_patch, y1_patch = [], []
+            for i in region:
+                x1_patch.append(vor.vertices[i][0])
+                y1_patch.append(vor.vertices[i][1])
+
+        x_patch.append(np.array(x1_patch))
+        y_patch.append(np.array(y1_patch))
+
+    center = vor.points.mean(axis=0)
+    ptp_bound = np.ptp(vor.points, axis=0)
+
+    line_segments = []
+    for pointidx, simplex in zip(vor.ridge_points, vor.ridge_vertices):
+        simplex = np.asarray(simplex)
+        if np.any(simplex < 0):
+            i = simplex[simplex >= 0][0]
+
+            t = vor.points[pointidx[1]] - vor.points[pointidx[0]]
+            t /= np.linalg.norm(t)
+            n = np.array([-t[1], t[0]])
+
+            midpoint = vor.points[pointidx].mean(axis=0)
+            direction = np.sign(np.dot(midpoint - center, n)) * n
+            far_point = vor.vertices[i] + direction * ptp_bound.max()
+
+            line_segments.append([(vor.vertices[i, 0], vor.vertices[i, 1]),
+                                  (far_point[0], far_point[1])])
+
+    x_vor_ls, y_vor_ls = [], []
+
+    for region in line_segments:
+
+        x1, y1 = [], []
+        for i in region:
+            x1.append(i[0])
+            y1.append(i[1])
+
+        x_vor_ls.append(np.array(x1))
+        y_vor_ls.append(np.array(y1))
+
+    x_patch = list(OrderedDict((tuple(x), x) for x in x_patch).values())
+    y_patch = list(OrderedDict((tuple(x), x) for x in y_patch).values())
+    x_vor_ls = list(OrderedDict((tuple(x), x) for x in x_vor_ls).values())
+    y_vor_ls = list(OrderedDict((tuple(x), x) for x in y_vor_ls).values())
+
+    return x_patch, y_patch, x_vor_ls, y_vor_ls
+
+
+def load_frames(path, n_frames):
+
+    df = pd.read_csv(path)
+    frames = [frame[['x', 'y']].values.astype(float) for _, frame in df.groupby('time', sort=True)]
+
+    return [Voronoi(points) for points in frames[:n_frames]]
+
+
+def same_output(a, b):
+
+    return all(len(u) == len(v) and all(np.array_equal(p, q) for p, q in zip(u, v)) for u, v in zip(a, b))
+
+
+def main(n_frames=200, repeat=5):
+
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample_data')
+
+    for name in ['soccer_sample.csv', 'sample_basketball.csv', 'nfl_sample_data.csv']:
+        vors = load_frames(os.path.join(root, name), n_frames)
+
+        if not all(same_output(patches_from_voronoi(vor), patches_from_voronoi_loop(vor)) for vor in vors):
+            raise AssertionError("Output of patches_from_voronoi differs from the loop version on {}".format(name))
+
+        loop = min(timeit.repeat(lambda: [patches_from_voronoi_loop(vor) for vor in vors], number=1, repeat=repeat))
+        vectorized = min(timeit.repeat(lambda: [patches_from_voronoi(vor) for vor in vors], number=1, repeat=repeat))
+
+        print("{:<24} {:>4} frames   loop {:8.3f} ms/frame   vectorized {:8.3f} ms/frame   speedup {:5.1f}x".format(
+            name, len(vors), 1e3 * loop / len(vors), 1e3 * vectorized / len(vors), loop / vectorized))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark suite - runs the make_plot and player_marking apps headlessly (on a bokeh Document, without a bokeh
+server) and the marking_stats aggregation on the sample datasets and on synthetic matches scaled to
+full-length 25 Hz tracking feeds (22 players and the ball).
+
+For each dataset it reports:
+
+    load      - building the FrameStore and the kinematics (distance, speed) of the players, and peak memory
+    animation - per-frame latency (p50/p95/p99) of each stage of the make_plot slider callback, with the voronoi,
+                convex hulls and speed and distance plots on, the serialization of the PATCH-DOC messages of
+                the frame, the bytes sent per frame and the frames per second
+    marking   - the same for the player_marking slider callback
+    stats     - end-to-end time, frames per second and peak memory of the marking_stats aggregation
+
+Results are written as json, so two runs (before and after a change) can be compared.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_suite.py --output before.json
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from bokeh.document import Document
+from bokeh.models.widgets import Slider, CheckboxButtonGroup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Animation.frame_store import FrameStore
+from Animation.game_animation import make_plot
+from Animation.marking_details import store_marking_counts, marking_table
+from Animation.physical_metrics import player_kinematics
+from Animation.player_marking import player_marking
+from Animation.stage_timer import StageTimer
+
+from bench_frame_delta import message_size
+
+HEADERS = ["x", "y", "team_id", "player_id", "time"]
+
+PITCH = ([-52.5, 52.5], [-34, 34])
+
+SAMPLES = [('soccer_sample.csv', 2, 1, 'football', 1, PITCH),
+           ('sample_basketball.csv', 65, 37, 'basketball', 1, ([0, 94], [0, 50])),
+           ('nfl_sample_data.csv', 'away', 'home', 'football', 1, ([0, 120], [0, 53.3]))]
+
+
+def synthetic_match(minutes=90, hz=25, players=11, seed=0):
+
+    """
+    :param minutes: Length of the match
+    :param hz: Frames per second
+    :param players: Players in each team
+    :param seed: Seed of the random walk - the same seed always gives the same match
+
+    :return: Returns a dataframe in the input format of the apps, with two teams (1 and 2) and the ball (0),
+             moving as smoothed random walks on a 105 x 68 pitch centered on 0.
+    """
+    rng = np.random.RandomState(seed)
+    n_frames, n_entities = int(minutes * 60 * hz), 2 * players + 1
+
+    step = rng.normal(scale=.25, size=(n_frames, n_entities, 2)).astype(np.float32)
+    step[:, -1] *= 3
+    velocity = pd.DataFrame(step.reshape(n_frames, -1)).ewm(span=hz).mean().values.reshape(step.shape)
+
+    xy = rng.uniform([-50, -32], [50, 32], size=(n_entities, 2)) + np.cumsum(velocity, axis=0)
+
+    # fold the walk back into the pitch
+    for axis, half in enumerate([52.5, 34]):
+        xy[:, :, axis] = np.abs((xy[:, :, axis] + half) % (4 * half) - 2 * half) - half
+
+    team_id = np.repeat([1, 2, 0], [players, players, 1])
+    player_id = np.r_[np.arange(1, players + 1), np.arange(1, players + 1), 0]
+    time = np.round(np.arange(n_frames) / float(hz), 2)
+
+    return pd.DataFrame({'x': xy[:, :, 0].ravel(), 'y': xy[:, :, 1].ravel(),
+                         'team_id': np.tile(team_id, n_frames), 'player_id': np.tile(player_id, n_frames),
+                         'time': np.repeat(time, n_entities)}, columns=HEADERS)
+
+
+def peak_memory(func, *args):
+
+    """
+    :return: Returns the result of func and the peak memory (MB) allocated while it ran
+    """
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return result, peak / 2. ** 20
+
+
+def sample_positions(store, n_frames):
+
+    if n_frames >= len(store):
+        return np.arange(len(store))
+
+    return np.unique(np.linspace(0, len(store) - 1, n_frames).astype(int))
+
+
+def timer_stats(timer, n_frames, seconds, sent):
+
+    stats = timer.stats()
+
+    return dict(frames=n_frames, seconds=seconds, frames_per_second=n_frames / seconds,
+                bytes_per_frame=sent / float(n_frames),
+                stages={stage: {column: float(value) for column, value in row.items()}
+                        for stage, row in stats.iterrows()})
+
+
+def bench_load(df, id_def, id_att, sport):
+
+    def load():
+        store = FrameStore(df, HEADERS, id_def, id_att, sport)
+        player_kinematics(store.xy, store.times)
+        return store
+
+    start = perf_counter()
+    load()
+    seconds = perf_counter() - start
+
+    store, peak = peak_memory(load)
+
+    return store, dict(seconds=seconds, peak_mb=peak, frames=len(store), players=len(store.player_ids))
+
+
+def sweep(doc, timer, times):
+
+    """
+    Moves the slider of the app to each time, as the browser does, so the real callback updates the sources.
+    The document changes of each frame are serialized to PATCH-DOC messages, as the bokeh server sends them.
+
+    :return: Returns the stats of the timer and the bytes sent per frame
+    """
+    slider = doc.select_one({'type': Slider})
+
+    # the slider starts on the first frame, which would not trigger the callback
+    slider.value = slider.end
+    timer.reset()
+
+    events = []
+    doc.on_change(events.append)
+
+    sent = 0
+    start = perf_counter()
+
+    for time in times:
+        slider.value = float(time)
+
+        with timer.stage('serialize'):
+            sent += message_size(events)
+        del events[:]
+
+    return timer_stats(timer, len(times), perf_counter() - start, sent)
+
+
+def bench_animation(store, positions, slider_steps, x_range, y_range):
+
+    """
+    make_plot slider callback for each frame - the voronoi and convex hulls are turned on as from the browser
+    """
+    doc, timer = Document(), StageTimer(size=len(positions))
+    make_plot(doc, store, HEADERS, store.id_def, store.id_att, slider_steps, x_range, y_range, 'pitch.png',
+              show_dist_speed=True, profile=timer)
+
+    for checkbox in doc.select({'type': CheckboxButtonGroup}):
+        if checkbox.visible:
+            checkbox.active = [0]
+
+    return sweep(doc, timer, store.times[positions])
+
+
+def bench_marking(store, positions, slider_steps, x_range, y_range):
+
+    """
+    player_marking slider callback for each frame - nearest defender of every attacker
+    """
+    doc, timer = Document(), StageTimer(size=len(positions))
+    player_marking(doc, store, HEADERS, store.id_def, store.id_att, slider_steps, x_range, y_range, 'pitch.png',
+                   profile=timer)
+
+    return sweep(doc, timer, store.times[positions])
+
+
+def bench_stats(store, time_steps, workers):
+
+    def stats():
+        source_ids, target_ids, counts, dist_sum = store_marking_counts(store, time_steps, workers=workers)
+        return marking_table(source_ids, target_ids, counts, dist_sum, time_steps)
+
+    start = perf_counter()
+    stats()
+    seconds = perf_counter() - start
+
+    _, peak = peak_memory(stats)
+
+    return dict(seconds=seconds, frames=len(store), frames_per_second=len(store) / seconds, peak_mb=peak)
+
+
+def run_dataset(df, id_def, id_att, sport, time_steps, pitch, n_frames, workers):
+
+    store, load = bench_load(df, id_def, id_att, sport)
+    positions = sample_positions(store, n_frames)
+
+    return dict(load=load,
+                animation=bench_animation(store, positions, time_steps, *pitch),
+                marking=bench_marking(store, positions, time_steps, *pitch),
+                stats=bench_stats(store, time_steps, workers))
+
+
+def flatten(results, prefix=''):
+
+    """
+    :return: Returns the numeric values of the nested results keyed by their path - 'soccer/animation/stages/...'
+    """
+    values = {}
+
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, prefix + key + '/'))
+        elif isinstance(value, (int, float)):
+            values[prefix + key] = value
+
+    return values
+
+
+def compare(old, new):
+
+    """
+    Prints the metrics of two runs side by side. Times, memory and bytes - lower is better, frames per second -
+    higher is better. Only the metrics that are in both runs are compared.
+    """
+    old_values, new_values = flatten(old['results']), flatten(new['results'])
+
+    metrics = [key for key in new_values if key in old_values and
+               key.split('/')[-1] in ('seconds', 'peak_mb', 'frames_per_second', 'bytes_per_frame',
+                                                      'p50', 'p95', 'p99')]
+
+    print("\n{:<64} {:>12} {:>12} {:>8}".format('metric', 'old', 'new', 'change'))
+
+    for key in metrics:
+        old_value, new_value = old_values[key], new_values[key]
+        change = (new_value / old_value - 1) * 100 if old_value else float('nan')
+        print("{:<64} {:>12.3f} {:>12.3f} {:>+7.1f}%".format(key, old_value, new_value, change))
+
+
+def git_commit():
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', help="Path of the json file the results are written to")
+    parser.add_argument('--compare', help="Path of the json results of an earlier run to compare against")
+    parser.add_argument('--frames', type=int, default=500,
+                        help="Number of frames (spread over the match) timed for the per-frame updates")
+    parser.add_argument('--synthetic', type=int, default=1, help="Number of synthetic full-length matches")
+    parser.add_argument('--minutes', type=float, default=90, help="Length of the synthetic matches")
+    parser.add_argument('--hz', type=int, default=25, help="Frame rate of the synthetic matches")
+    parser.add_argument('--workers', type=int, default=1, help="Processes used by the marking_stats aggregation")
+    args = parser.parse_args()
+
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sample_data')
+
+    datasets = [(name, lambda name=name: pd.read_csv(os.path.join(root, name)), id_def, id_att, sport, time_steps,
+                 pitch) for name, id_def, id_att, sport, time_steps, pitch in SAMPLES]
+    datasets += [('synthetic_{}'.format(seed), lambda seed=seed: synthetic_match(args.minutes, args.hz, seed=seed),
+                  1, 2, 'football', 1. / args.hz, PITCH) for seed in range(args.synthetic)]
+
+    results = {}
+
+    for name, load_df, id_def, id_att, sport, time_steps, pitch in datasets:
+        result = run_dataset(load_df(), id_def, id_att, sport, time_steps, pitch, args.frames, args.workers)
+        results[name] = result
+
+        animation, marking, stats = result['animation'], result['marking'], result['stats']
+        print("{:<24} {:>7} frames   load {:7.2f} s {:7.1f} MB   animation p50 {:6.2f} p99 {:6.2f} ms {:6.0f} B   "
+              "marking p50 {:5.3f} ms {:5.0f} B   stats {:9.0f} frames/s {:7.1f} MB".format(
+                  name, result['load']['frames'], result['load']['seconds'], result['load']['peak_mb'],
+                  animation['stages']['total']['p50'], animation['stages']['total']['p99'],
+                  animation['bytes_per_frame'], marking['stages']['total']['p50'], marking['bytes_per_frame'],
+                  stats['frames_per_second'], stats['peak_mb']))
+
+    run = dict(meta=dict(date=datetime.datetime.now().isoformat(), commit=git_commit(),
+                         python=platform.python_version(), numpy=np.__version__, pandas=pd.__version__,
+                         platform=platform.platform(), args=vars(args)),
+               results=results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), run)
+
+
+if __name__ == '__main__':
+    main()